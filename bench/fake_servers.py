@@ -0,0 +1,324 @@
+import asyncio
+import datetime
+import itertools
+import random
+import uuid
+import zlib
+from dataclasses import dataclass
+from aiohttp import web
+
+"""
+Local stand-ins for Radarr, Sonarr and Jellyfin, implementing the endpoints
+used by the bot so it can be benchmarked without live servers
+"""
+
+# Value of `added` for content that isn't in the library yet
+NOT_ADDED = "0001-01-01T05:51:00Z"
+
+
+@dataclass
+class FakeOptions:
+    # Base latency and random jitter added to every response, in seconds
+    latency: float = 0.02
+    jitter: float = 0.01
+    # Fraction of requests answered with a 500
+    error_rate: float = 0.0
+    # Number of results returned by a lookup
+    lookup_results: int = 20
+    # Length of the overview of each piece of content, controls payload size
+    overview_size: int = 500
+    # Number of pieces of content already in the library
+    library_size: int = 500
+    # Number of records in the download queue
+    queue_size: int = 100
+
+
+@web.middleware
+async def simulate_conditions(request: web.Request, handler):
+    options = request.app["options"]
+    await asyncio.sleep(
+        max(0, options.latency + random.uniform(-1, 1) * options.jitter)
+    )
+    if random.random() < options.error_rate:
+        return web.json_response({"message": "Simulated error"}, status=500)
+    return await handler(request)
+
+
+def make_content(service: str, content_id: int, options: FakeOptions) -> dict:
+    """
+    Build a lookup payload similar to the one returned by Radarr/Sonarr
+
+    Args:
+        service (str): radarr or sonarr
+        content_id (int): The TMDB/TVDB ID of the content
+        options (FakeOptions): The server options
+
+    Returns:
+        dict: The content payload
+    """
+    content = {
+        "title": f"Title {content_id}",
+        "year": 1950 + content_id % 75,
+        "overview": "x" * options.overview_size,
+        "images": [
+            {
+                "coverType": "poster",
+                "remoteUrl": f"https://example.com/{content_id}.jpg",
+            }
+        ],
+        "added": NOT_ADDED,
+    }
+    if service == "radarr":
+        content["tmdbId"] = content_id
+    else:
+        content["tvdbId"] = content_id
+        content["statistics"] = {"percentOfEpisodes": 0.0}
+    return content
+
+
+def create_arr_app(service: str, options: FakeOptions) -> web.Application:
+    """
+    Create a fake Radarr (service="radarr") or Sonarr (service="sonarr")
+
+    Args:
+        service (str): radarr or sonarr
+        options (FakeOptions): The server options
+
+    Returns:
+        web.Application: The fake server
+    """
+    kind = "movie" if service == "radarr" else "series"
+    app = web.Application(middlewares=[simulate_conditions])
+    app["options"] = options
+
+    # Content in the library, indexed by local ID
+    library = {}
+    for local_id in range(1, options.library_size + 1):
+        content = make_content(service, 1_000_000 + local_id, options)
+        content["id"] = local_id
+        content["added"] = "2024-01-01T00:00:00Z"
+        if service == "radarr":
+            content["hasFile"] = local_id % 2 == 0
+        library[local_id] = content
+    next_id = itertools.count(options.library_size + 1)
+    queue = [
+        {
+            "id": record_id,
+            f"{kind}Id": random.randint(1, max(1, options.library_size)),
+            "timeleft": "01:23:45",
+        }
+        for record_id in range(1, options.queue_size + 1)
+    ]
+    history = []
+    next_history_id = itertools.count(1)
+
+    async def quality_profiles(request):
+        return web.json_response([{"id": 1, "name": "Any"}])
+
+    async def root_folders(request):
+        return web.json_response([{"id": 1, "path": f"/{kind}"}])
+
+    async def system_status(request):
+        return web.json_response({"version": "0.0.0"})
+
+    async def lookup(request):
+        term = request.query.get("term", "")
+        # Sonarr lookups by ID use the `tvdb:<id>` term
+        if term.startswith("tvdb:"):
+            return web.json_response(
+                [make_content(service, int(term[5:]), options)]
+            )
+        start = zlib.crc32(term.encode()) % 1_000_000
+        return web.json_response(
+            [
+                make_content(service, start + i, options)
+                for i in range(options.lookup_results)
+            ]
+        )
+
+    async def lookup_tmdb(request):
+        return web.json_response(
+            make_content(service, int(request.query["tmdbId"]), options)
+        )
+
+    async def list_content(request):
+        return web.json_response(list(library.values()))
+
+    async def get_content(request):
+        content = library.get(int(request.match_info["id"]))
+        if content is None:
+            return web.json_response({"message": "NotFound"}, status=404)
+        return web.json_response(content)
+
+    async def add_content(request):
+        content = await request.json()
+        content["id"] = next(next_id)
+        content["added"] = "2024-01-01T00:00:00Z"
+        library[content["id"]] = content
+        # Added content is searched for and grabbed right away
+        history.append(
+            {
+                "id": next(next_history_id),
+                f"{kind}Id": content["id"],
+                "eventType": "grabbed",
+                "date": datetime.datetime.now(datetime.timezone.utc)
+                .isoformat()
+                .replace("+00:00", "Z"),
+            }
+        )
+        return web.json_response(content, status=201)
+
+    async def get_queue(request):
+        page = int(request.query.get("page", 1))
+        page_size = int(request.query.get("pageSize", 10))
+        start = (page - 1) * page_size
+        return web.json_response(
+            {
+                "page": page,
+                "pageSize": page_size,
+                "totalRecords": len(queue),
+                "records": queue[start : start + page_size],
+            }
+        )
+
+    app.router.add_get("/api/v3/qualityProfile", quality_profiles)
+    app.router.add_get("/api/v3/rootfolder", root_folders)
+    app.router.add_get("/api/v3/system/status", system_status)
+    app.router.add_get(f"/api/v3/{kind}/lookup", lookup)
+    if service == "radarr":
+        app.router.add_get("/api/v3/movie/lookup/tmdb", lookup_tmdb)
+    app.router.add_get(f"/api/v3/{kind}", list_content)
+    app.router.add_get(f"/api/v3/{kind}/{{id:\\d+}}", get_content)
+    app.router.add_post(f"/api/v3/{kind}", add_content)
+
+    async def get_history_since(request):
+        since = request.query["date"].replace("Z", "+00:00")
+        since = datetime.datetime.fromisoformat(since)
+        return web.json_response(
+            [
+                record
+                for record in history
+                if datetime.datetime.fromisoformat(
+                    record["date"].replace("Z", "+00:00")
+                )
+                >= since
+            ]
+        )
+
+    app.router.add_get("/api/v3/queue", get_queue)
+    app.router.add_get("/api/v3/history/since", get_history_since)
+    return app
+
+
+def create_jellyfin_app(options: FakeOptions) -> web.Application:
+    """
+    Create a fake Jellyfin server
+
+    Args:
+        options (FakeOptions): The server options
+
+    Returns:
+        web.Application: The fake server
+    """
+    app = web.Application(middlewares=[simulate_conditions])
+    app["options"] = options
+    # Users indexed by ID
+    users = {}
+    app["users"] = users
+
+    async def system_info(request):
+        return web.json_response({"Version": "10.9.0"})
+
+    async def list_users(request):
+        return web.json_response(list(users.values()))
+
+    async def new_user(request):
+        body = await request.json()
+        user_id = uuid.uuid4().hex
+        users[user_id] = {
+            "Id": user_id,
+            "Name": body["Name"],
+            "Policy": {"IsAdministrator": False, "IsDisabled": False},
+        }
+        return web.json_response(users[user_id])
+
+    async def get_user(request):
+        user = users.get(request.match_info["id"])
+        if user is None:
+            return web.Response(status=404)
+        return web.json_response(user)
+
+    async def update_policy(request):
+        user = users.get(request.match_info["id"])
+        if user is None:
+            return web.Response(status=404)
+        user["Policy"] = await request.json()
+        return web.Response(status=204)
+
+    async def update_password(request):
+        if request.match_info["id"] not in users:
+            return web.Response(status=404)
+        return web.Response(status=204)
+
+    async def delete_user(request):
+        if users.pop(request.match_info["id"], None) is None:
+            return web.Response(status=404)
+        return web.Response(status=204)
+
+    app.router.add_get("/System/Info", system_info)
+    app.router.add_get("/Users", list_users)
+    app.router.add_post("/Users/New", new_user)
+    app.router.add_get("/Users/{id}", get_user)
+    app.router.add_post("/Users/{id}/Policy", update_policy)
+    app.router.add_post("/Users/{id}/Password", update_password)
+    app.router.add_delete("/Users/{id}", delete_user)
+    return app
+
+
+async def start_app(app: web.Application, host: str = "127.0.0.1") -> tuple:
+    """
+    Serve an app on a free port
+
+    Args:
+        app (web.Application): The app to serve
+        host (str): The interface to listen on
+
+    Returns:
+        tuple: The runner (to clean up) and the base URL of the server
+    """
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Serve fake Radarr, Sonarr and Jellyfin servers"
+    )
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--radarr-port", type=int, default=7878)
+    parser.add_argument("--sonarr-port", type=int, default=8989)
+    parser.add_argument("--jellyfin-port", type=int, default=8096)
+    args = parser.parse_args()
+
+    options = FakeOptions(latency=args.latency, error_rate=args.error_rate)
+
+    async def serve() -> None:
+        for app, port in (
+            (create_arr_app("radarr", options), args.radarr_port),
+            (create_arr_app("sonarr", options), args.sonarr_port),
+            (create_jellyfin_app(options), args.jellyfin_port),
+        ):
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", port).start()
+            print(f"Serving on http://127.0.0.1:{port}")
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
@@ -0,0 +1,506 @@
+import argparse
+import asyncio
+import datetime
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+"""
+Benchmark the bot against local stand-ins for Radarr, Sonarr and Jellyfin,
+reporting the latency percentiles and throughput of each scenario
+
+    python bench/run.py --requests 500 --concurrency 50 --latency 0.05
+"""
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code")
+)
+
+import utils.config as config
+from fake_servers import (
+    FakeOptions,
+    create_arr_app,
+    create_jellyfin_app,
+    start_app,
+)
+
+SCENARIOS = (
+    "get_content",
+    "get_content_by_id",
+    "add_content",
+    "status",
+    "sync_status",
+    "create_account",
+    "delete_accounts",
+)
+
+
+async def noop(*args, **kwargs) -> None:
+    pass
+
+
+class FakeInteraction:
+    """
+    The parts of `discord.Interaction` used by the benchmarked commands
+    """
+
+    def __init__(self, user_id: int):
+        self.user = SimpleNamespace(id=user_id)
+        self.response = SimpleNamespace(defer=noop)
+        self.followup = SimpleNamespace(send=self.send)
+        self.sent = []
+
+    async def send(self, **kwargs) -> None:
+        self.sent.append(kwargs)
+
+
+def configure(urls: dict, args: argparse.Namespace) -> None:
+    """
+    Point the config at the fake servers, as `load_config` would
+
+    Args:
+        urls (dict): The base URL of each fake server
+        args (argparse.Namespace): The command line arguments
+    """
+    config.LOG.setLevel(logging.CRITICAL)
+    for service in ("radarr", "sonarr"):
+        prefix = service.upper()
+        setattr(config, f"{prefix}_HOST_URL", urls[service])
+        setattr(
+            config,
+            f"{prefix}_HEADERS",
+            {"Content-Type": "application/json", "X-Api-Key": "bench"},
+        )
+        setattr(config, f"{prefix}_ROOT_FOLDER_PATH", f"/{service}")
+        setattr(config, f"{prefix}_QUALITY_PROFILE_ID", 1)
+        setattr(config, f"{prefix}_ENABLED", True)
+    config.JELLYFIN_URL = urls["jellyfin"]
+    config.JELLYFIN_HEADERS = {
+        "Content-Type": "application/json",
+        "X-Emby-Token": "bench",
+    }
+    config.ACCOUNT_TIME = 1
+    config.SIMPLE_PASSWORDS = False
+    config.JELLYFIN_ENABLED = True
+    config.HTTP_POOL_SIZE = args.pool_size
+    config.JELLYFIN_MAX_CONCURRENT_CREATIONS = args.concurrency
+    config.DATABASE_URL = "sqlite+aiosqlite:///data/bench.db"
+
+
+async def measure(
+    operation, requests: int, concurrency: int, setup=None
+) -> dict:
+    """
+    Run an operation `requests` times, at most `concurrency` at once
+
+    Args:
+        operation (coroutine function): Called with the request number,
+            raises or returns a falsy value on failure
+        requests (int): The number of times to run the operation
+        concurrency (int): The number of operations run at the same time
+        setup (coroutine function): Called with the request number before
+            each operation, outside of the measured time
+
+    Returns:
+        dict: The latencies (in seconds), errors and elapsed time
+    """
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    busy = 0.0
+
+    async def run_one(i: int) -> None:
+        nonlocal errors, busy
+        async with semaphore:
+            if setup is not None:
+                setup_start = time.perf_counter()
+                await setup(i)
+                busy += time.perf_counter() - setup_start
+            start = time.perf_counter()
+            try:
+                result = await operation(i)
+            except Exception:
+                result = False
+            if result is False or result is None:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[run_one(i) for i in range(requests)])
+    # Setup time is excluded from the throughput when running sequentially
+    elapsed = time.perf_counter() - start - (busy if concurrency == 1 else 0)
+    return {"latencies": latencies, "errors": errors, "elapsed": elapsed}
+
+
+def percentiles(latencies: list) -> tuple:
+    """
+    Get the p50, p95 and p99 of the latencies, in milliseconds
+
+    Args:
+        latencies (list): The latencies in seconds
+
+    Returns:
+        tuple: The p50, p95 and p99
+    """
+    if not latencies:
+        return math.nan, math.nan, math.nan
+    if len(latencies) == 1:
+        return (latencies[0] * 1000,) * 3
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000
+
+
+async def bench_get_content(http, args) -> dict:
+    from utils.content_get import get_content
+    from utils.lookup_cache import LookupCache
+
+    cache = LookupCache(config.LOOKUP_CACHE_SIZE, config.LOOKUP_CACHE_TTL)
+
+    async def operation(i: int):
+        service = ("radarr", "sonarr")[i % 2]
+        # Draw from a limited set of queries so some searches are repeated
+        query = f"query {random.randrange(args.queries)}"
+        return await get_content(
+            query,
+            service,
+            getattr(config, f"{service.upper()}_HOST_URL"),
+            getattr(config, f"{service.upper()}_HEADERS"),
+            http,
+            cache,
+        )
+
+    return await measure(operation, args.requests, args.concurrency)
+
+
+async def bench_get_content_by_id(http, args) -> dict:
+    from utils.content_get import get_content_by_id
+    from utils.library_mirror import LibraryMirror
+    from utils.lookup_cache import LookupCache
+
+    cache = LookupCache(config.LOOKUP_CACHE_SIZE, config.LOOKUP_CACHE_TTL)
+    # Mirror the libraries, as the bot does in the background
+    library = LibraryMirror()
+    for service, kind in (("radarr", "movie"), ("sonarr", "series")):
+        _, content = await http.get(
+            service,
+            f"{getattr(config, f'{service.upper()}_HOST_URL')}/api/v3/{kind}",
+            headers=getattr(config, f"{service.upper()}_HEADERS"),
+        )
+        library.sync(service, content)
+
+    async def operation(i: int):
+        service = ("radarr", "sonarr")[i % 2]
+        # Half of the IDs are already in the library
+        if i % 4 < 2:
+            content_id = 1_000_000 + random.randint(1, args.library_size)
+        else:
+            content_id = 2_000_000 + i
+        result = await get_content_by_id(
+            content_id,
+            service,
+            getattr(config, f"{service.upper()}_HOST_URL"),
+            getattr(config, f"{service.upper()}_HEADERS"),
+            http,
+            cache,
+            library,
+        )
+        return result != "NO RESULTS"
+
+    return await measure(operation, args.requests, args.concurrency)
+
+
+async def bench_add_content(http, args) -> dict:
+    from utils.content_add import add_content
+    from utils.lookup_cache import LookupCache
+
+    cache = LookupCache(config.LOOKUP_CACHE_SIZE, config.LOOKUP_CACHE_TTL)
+
+    async def operation(i: int):
+        service = ("radarr", "sonarr")[i % 2]
+        prefix = service.upper()
+        return await add_content(
+            {"contentId": 2_000_000 + i},
+            service,
+            getattr(config, f"{prefix}_HOST_URL"),
+            getattr(config, f"{prefix}_HEADERS"),
+            getattr(config, f"{prefix}_ROOT_FOLDER_PATH"),
+            getattr(config, f"{prefix}_QUALITY_PROFILE_ID"),
+            http,
+            cache,
+        )
+
+    return await measure(operation, args.requests, args.concurrency)
+
+
+async def bench_status(http, args) -> dict:
+    from utils.models import Requests
+    from utils.queue_cache import QueueCache
+    from utils.repository import add_requests
+    from utils.status_reconciler import StatusReconciler
+    from cogs.status import Status
+
+    # Every simulated user gets their own requests, since `/status` removes
+    # the requests of finished content
+    await add_requests(
+        [
+            Requests(
+                title=f"Title {local_id}",
+                release_year=2000,
+                local_id=local_id,
+                tmdbid=local_id if local_id % 2 else None,
+                tvdbid=None if local_id % 2 else local_id,
+                user_id=user_id,
+            )
+            for user_id in range(args.requests)
+            for local_id in random.sample(
+                range(1, args.library_size + 1),
+                min(args.requests_per_user, args.library_size),
+            )
+        ]
+    )
+    queue_cache = QueueCache(
+        http, config.QUEUE_REFRESH_INTERVAL * 2, config.QUEUE_PAGE_SIZE
+    )
+    bot = SimpleNamespace(
+        http_client=http,
+        queue_cache=queue_cache,
+        status_reconciler=StatusReconciler(http, queue_cache, None),
+    )
+    cog = Status(bot)
+    # The statuses are kept up to date in the background by the bot
+    if not args.cold_status:
+        await bot.status_reconciler.reconcile()
+    views = []
+
+    async def operation(i: int):
+        interaction = FakeInteraction(i)
+        await cog.status.callback(cog, interaction)
+        views.extend(
+            sent["view"] for sent in interaction.sent if "view" in sent
+        )
+        return True
+
+    result = await measure(operation, args.requests, args.concurrency)
+    # Wait for the next pages to finish prefetching
+    for view in views:
+        await view.on_timeout()
+    return result
+
+
+async def bench_sync_status(http, args) -> dict:
+    from utils.models import Requests
+    from utils.queue_cache import QueueCache
+    from utils.repository import add_requests
+    from utils.status_reconciler import StatusReconciler
+
+    await add_requests(
+        [
+            Requests(
+                title=f"Title {local_id}",
+                release_year=2000,
+                local_id=local_id,
+                tmdbid=local_id if local_id % 2 else None,
+                tvdbid=None if local_id % 2 else local_id,
+                user_id=user_id,
+            )
+            for user_id in range(args.requests)
+            for local_id in random.sample(
+                range(1, args.library_size + 1),
+                min(args.requests_per_user, args.library_size),
+            )
+        ]
+    )
+    queue_cache = QueueCache(
+        http, config.QUEUE_REFRESH_INTERVAL * 2, config.QUEUE_PAGE_SIZE
+    )
+    reconciler = StatusReconciler(http, queue_cache, None)
+    # The first sync checks everything, the ones measured only what changed
+    await reconciler.sync()
+
+    async def operation(i: int):
+        await reconciler.sync()
+        return True
+
+    # Syncs run one after the other in the bot
+    return await measure(operation, args.requests, 1)
+
+
+async def bench_create_account(http, args) -> dict:
+    from utils.jellyfin_create import create_jellyfin_account
+
+    async def operation(i: int):
+        return await create_jellyfin_account(i, http)
+
+    return await measure(operation, args.requests, args.concurrency)
+
+
+async def bench_delete_accounts(http, args, jellyfin_users: dict) -> dict:
+    from utils.database import Session
+    from utils.models import JellyfinAccounts
+    from utils.jellyfin_delete import ExpiryScheduler
+
+    scheduler = ExpiryScheduler(http)
+    expired = datetime.datetime.now() - datetime.timedelta(hours=1)
+
+    async def setup(i: int) -> None:
+        # Expire a batch of accounts before every run
+        ids = [f"bench-{i}-{n}" for n in range(args.accounts)]
+        for jellyfin_user_id in ids:
+            jellyfin_users[jellyfin_user_id] = {
+                "Id": jellyfin_user_id,
+                "Policy": {"IsAdministrator": False},
+            }
+        async with Session() as session:
+            session.add_all(
+                [
+                    JellyfinAccounts(
+                        user_id=i,
+                        jellyfin_user_id=jellyfin_user_id,
+                        deletion_time=expired,
+                    )
+                    for jellyfin_user_id in ids
+                ]
+            )
+            await session.commit()
+
+    async def operation(i: int):
+        await scheduler.reconcile()
+        return True
+
+    # Runs are sequential, as they are in the bot
+    return await measure(
+        operation, max(1, args.requests // args.accounts), 1, setup
+    )
+
+
+async def main(args: argparse.Namespace) -> int:
+    random.seed(args.seed)
+    options = FakeOptions(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        lookup_results=args.lookup_results,
+        overview_size=args.overview_size,
+        library_size=args.library_size,
+        queue_size=args.queue_size,
+    )
+    apps = {
+        "radarr": create_arr_app("radarr", options),
+        "sonarr": create_arr_app("sonarr", options),
+        "jellyfin": create_jellyfin_app(options),
+    }
+    runners, urls = [], {}
+    for name, app in apps.items():
+        runner, urls[name] = await start_app(app)
+        runners.append(runner)
+
+    configure(urls, args)
+
+    from utils.database import init_database, close_database
+    from utils.http_client import HTTPClient
+
+    await init_database()
+    http = HTTPClient(
+        config.HTTP_POOL_SIZE,
+        config.HTTP_TIMEOUT,
+        config.HTTP_CONNECT_TIMEOUT,
+        config.HTTP_KEEPALIVE_TIMEOUT,
+    )
+
+    print(
+        f"{'scenario':<18}{'ok':>7}{'errors':>8}{'p50 ms':>10}"
+        f"{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}"
+    )
+    failed = False
+    try:
+        for scenario in args.scenario:
+            if scenario == "delete_accounts":
+                result = await bench_delete_accounts(
+                    http, args, apps["jellyfin"]["users"]
+                )
+            else:
+                result = await globals()[f"bench_{scenario}"](http, args)
+
+            p50, p95, p99 = percentiles(result["latencies"])
+            throughput = len(result["latencies"]) / result["elapsed"]
+            print(
+                f"{scenario:<18}{len(result['latencies']):>7}"
+                f"{result['errors']:>8}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}"
+                f"{throughput:>10.1f}"
+            )
+            if args.max_p95 is not None and not p95 <= args.max_p95:
+                failed = True
+    finally:
+        await http.close()
+        await close_database()
+        for runner in runners:
+            await runner.cleanup()
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark CordArr against fake Radarr/Sonarr/Jellyfin"
+    )
+    parser.add_argument(
+        "--scenario",
+        nargs="+",
+        choices=SCENARIOS,
+        default=list(SCENARIOS),
+        help="Scenarios to run (default: all)",
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=config.HTTP_POOL_SIZE,
+        help="Connections per service",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Seconds per response"
+    )
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--lookup-results", type=int, default=20)
+    parser.add_argument("--overview-size", type=int, default=500)
+    parser.add_argument("--library-size", type=int, default=500)
+    parser.add_argument("--queue-size", type=int, default=100)
+    parser.add_argument(
+        "--queries",
+        type=int,
+        default=50,
+        help="Number of distinct search queries",
+    )
+    parser.add_argument("--requests-per-user", type=int, default=10)
+    parser.add_argument(
+        "--cold-status",
+        action="store_true",
+        help="Run `/status` before the request statuses are reconciled",
+    )
+    parser.add_argument(
+        "--accounts",
+        type=int,
+        default=50,
+        help="Accounts expired before each delete_accounts run",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--max-p95",
+        type=float,
+        help="Exit with an error if a scenario's p95 (ms) is above this",
+    )
+    args = parser.parse_args()
+
+    # The SQLite database is created in a throwaway directory
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        sys.exit(asyncio.run(main(args)))
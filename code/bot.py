@@ -1,42 +1,414 @@
 import discord
 from discord.ext import commands, tasks
+import asyncio
 import os
 
-from utils.database import Base, engine
+from utils.database import init_database, close_database
+from utils.http_client import HTTPClient
+from utils.queue_cache import QueueCache
+from utils.lookup_cache import LookupCache
+from utils.title_index import TitleIndex
+from utils.library_mirror import LibraryMirror
+from utils.metrics import (
+    InstrumentedCommandTree,
+    MetricsServer,
+    record_command,
+)
+from utils.diagnostics import StallMonitor
+from utils.services import ServiceMonitor
+from utils.status_reconciler import StatusReconciler
+from utils.leader import LeaderLock
 import utils.config as config
 
+# How often config.yaml is checked for changes, in seconds
+CONFIG_POLL_INTERVAL = 5
+# Settings of each upstream service, its connections are replaced and it is
+# checked again when they change
+SERVICE_SETTINGS = {
+    service: {
+        f"{prefix}_{name}"
+        for name in (
+            "ENABLED",
+            "HOST_URL",
+            "HEADERS",
+            "ROOT_FOLDER_PATH",
+            "QUALITY_PROFILE_ID",
+        )
+    }
+    for service, prefix in (("radarr", "RADARR"), ("sonarr", "SONARR"))
+}
+SERVICE_SETTINGS["jellyfin"] = {
+    "JELLYFIN_ENABLED",
+    "JELLYFIN_URL",
+    "JELLYFIN_HEADERS",
+}
+HTTP_SETTINGS = {
+    "HTTP_POOL_SIZE",
+    "HTTP_TIMEOUT",
+    "HTTP_CONNECT_TIMEOUT",
+    "HTTP_KEEPALIVE_TIMEOUT",
+}
+# Settings only used while starting up
+RESTART_SETTINGS = {
+    "BOT_TOKEN",
+    "JELLYFIN_MAX_CONCURRENT_CREATIONS",
+    "JELLYFIN_POOL_SIZE",
+    "WEBHOOK_ENABLED",
+    "WEBHOOK_HOST",
+    "WEBHOOK_PORT",
+    "METRICS_ENABLED",
+    "METRICS_HOST",
+    "METRICS_PORT",
+    "DIAGNOSTICS_ENABLED",
+    "DIAGNOSTICS_SLOW_CALLBACK_DURATION",
+    "SHARD_COUNT",
+    "SHARD_IDS",
+    "LEADER_LEASE",
+    "DATABASE_URL",
+    "DATABASE_POOL_SIZE",
+    "DATABASE_MAX_OVERFLOW",
+    "DATABASE_POOL_RECYCLE",
+}
+
 
-class MyBot(commands.Bot):
+class MyBot(commands.AutoShardedBot):
     def __init__(self):
+        # Runs a single shard unless sharding is set up in the config
         super().__init__(
             command_prefix="#",
             intents=discord.Intents.default(),
+            tree_cls=InstrumentedCommandTree,
+            shard_count=config.SHARD_COUNT,
+            shard_ids=config.SHARD_IDS,
         )
+        self.http_client = None
+        self.queue_cache = None
+        self.lookup_cache = None
+        self.services = None
+        self.status_reconciler = None
+        self.title_index = TitleIndex()
+        self.library = LibraryMirror()
+        self.expiry_scheduler = None
+        self.account_pool = None
+        self.leader = None
+        self.metrics_server = None
+        self.diagnostics = None
+        self.config_mtime = None
 
     async def setup_hook(self):
-        delete_accounts_task.start()
+        # Reports and attributes anything blocking the event loop
+        if config.DIAGNOSTICS_ENABLED:
+            self.diagnostics = StallMonitor(
+                config.DIAGNOSTICS_SLOW_CALLBACK_DURATION
+            )
+            self.diagnostics.start()
+        await init_database()
+        if config.METRICS_ENABLED:
+            self.metrics_server = MetricsServer(
+                self, config.METRICS_HOST, config.METRICS_PORT
+            )
+            await self.metrics_server.start()
+        # Shared HTTP client used by every cog/util for upstream calls
+        self.http_client = HTTPClient(
+            config.HTTP_POOL_SIZE,
+            config.HTTP_TIMEOUT,
+            config.HTTP_CONNECT_TIMEOUT,
+            config.HTTP_KEEPALIVE_TIMEOUT,
+        )
+        # Check the services without blocking on the ones that are down
+        self.services = ServiceMonitor(
+            self.http_client,
+            config.SERVICE_CHECK_TIMEOUT,
+            config.SERVICE_CHECK_INTERVAL,
+        )
+        await self.services.check_all()
+        self.services.start()
+        # Shared download queue snapshot, refreshed in the background
+        self.queue_cache = QueueCache(
+            self.http_client,
+            config.QUEUE_REFRESH_INTERVAL * 2,
+            config.QUEUE_PAGE_SIZE,
+        )
+        # Cache of search results shared by `/request` and content adds
+        self.lookup_cache = LookupCache(
+            config.LOOKUP_CACHE_SIZE, config.LOOKUP_CACHE_TTL
+        )
+        queue_refresh_task.change_interval(
+            seconds=config.QUEUE_REFRESH_INTERVAL
+        )
+        # Keeps the status stored with every request up to date
+        self.status_reconciler = StatusReconciler(
+            self.http_client, self.queue_cache, self.services
+        )
+        status_reconcile_task.change_interval(
+            seconds=config.STATUS_RECONCILE_INTERVAL
+        )
+        library_task.change_interval(
+            seconds=config.AUTOCOMPLETE_REFRESH_INTERVAL
+        )
+        library_task.start()
+        # Several processes may share the database once sharding is set up
+        shared = config.SHARD_IDS is not None or config.SHARD_COUNT != 1
+        if config.JELLYFIN_ENABLED:
+            self.expiry_scheduler = self.create_expiry_scheduler()
+        # Disabled Jellyfin accounts created ahead of `/newaccount`
+        if config.JELLYFIN_ENABLED and config.JELLYFIN_POOL_SIZE:
+            from utils.jellyfin_pool import AccountPool
+
+            self.account_pool = AccountPool(
+                self.http_client, config.JELLYFIN_POOL_SIZE
+            )
+            account_pool_task.change_interval(
+                seconds=config.JELLYFIN_POOL_REFILL_INTERVAL
+            )
+        # Only one process sharing the database runs the tasks above
+        if shared:
+            self.leader = LeaderLock(
+                "leader",
+                config.LEADER_LEASE,
+                self.start_leader_tasks,
+                self.stop_leader_tasks,
+            )
+            self.leader.start()
+        else:
+            self.start_leader_tasks()
+        # Pick up changes to config.yaml without restarting
+        self.config_mtime = os.stat(config.config_path()).st_mtime
+        config_reload_task.start()
         for ext in os.listdir("./code/cogs"):
             if ext.endswith(".py"):
                 await self.load_extension(f"cogs.{ext[:-3]}")
 
+    def create_expiry_scheduler(self):
+        """
+        Create the scheduler deleting expired Jellyfin accounts as their
+        deletion time passes. Other processes can't wake it up when they
+        create accounts, so it also checks every lease when the database is
+        shared
+
+        Returns:
+            ExpiryScheduler: The scheduler, not started yet
+        """
+        from utils.jellyfin_delete import ExpiryScheduler
+
+        shared = config.SHARD_IDS is not None or config.SHARD_COUNT != 1
+        return ExpiryScheduler(
+            self.http_client,
+            config.LEADER_LEASE if shared else None,
+            self.services,
+        )
+
+    def start_leader_tasks(self) -> None:
+        if self.expiry_scheduler:
+            self.expiry_scheduler.start()
+        start_loop(queue_refresh_task)
+        start_loop(status_reconcile_task)
+        if self.account_pool:
+            start_loop(account_pool_task)
+
+    def stop_leader_tasks(self) -> None:
+        if self.expiry_scheduler:
+            self.expiry_scheduler.stop()
+        queue_refresh_task.cancel()
+        status_reconcile_task.cancel()
+        account_pool_task.cancel()
+
+    async def on_ready(self):
+        config.LOG.info(f"{self.user} has connected to Discord.")
+
+    async def on_shard_ready(self, shard_id: int):
+        config.LOG.info(f"Shard {shard_id} has connected to Discord.")
+
+    async def on_app_command_completion(
+        self, interaction: discord.Interaction, command
+    ):
+        record_command(interaction, "success")
 
-bot = MyBot()
-bot.remove_command("help")
+    async def apply_config(self, changed: set) -> None:
+        """
+        Apply reloaded settings to the shared clients, caches and tasks
+
+        Args:
+            changed (set): The names of the settings that changed
+        """
+        config.LOG.info(
+            f"Reloaded config.yaml, changed: {', '.join(sorted(changed))}"
+        )
+        if changed & HTTP_SETTINGS:
+            self.http_client.configure(
+                config.HTTP_POOL_SIZE,
+                config.HTTP_TIMEOUT,
+                config.HTTP_CONNECT_TIMEOUT,
+                config.HTTP_KEEPALIVE_TIMEOUT,
+            )
+
+        rechecks = [
+            service
+            for service, settings in SERVICE_SETTINGS.items()
+            if changed & settings
+        ]
+        for service in rechecks:
+            self.http_client.reset(service)
+        if rechecks:
+            # Cached lookups and queues may come from the previous hosts
+            self.lookup_cache.clear()
+            queue_refresh_task.restart()
+            await asyncio.gather(
+                *[
+                    self.services.check(service)
+                    for service in rechecks
+                    if service in self.services.services()
+                ]
+            )
+
+        if "JELLYFIN_ENABLED" in changed:
+            if self.expiry_scheduler:
+                self.expiry_scheduler.stop()
+                self.expiry_scheduler = None
+            if config.JELLYFIN_ENABLED:
+                self.expiry_scheduler = self.create_expiry_scheduler()
+                # Only where the leader's tasks run
+                if self.leader is None or self.leader.is_leader:
+                    self.expiry_scheduler.start()
+
+        self.queue_cache.max_age = config.QUEUE_REFRESH_INTERVAL * 2
+        self.queue_cache.page_size = config.QUEUE_PAGE_SIZE
+        self.lookup_cache.max_size = config.LOOKUP_CACHE_SIZE
+        self.lookup_cache.ttl = config.LOOKUP_CACHE_TTL
+        self.services.timeout = config.SERVICE_CHECK_TIMEOUT
+        self.services.interval = config.SERVICE_CHECK_INTERVAL
+        if "QUEUE_REFRESH_INTERVAL" in changed:
+            queue_refresh_task.change_interval(
+                seconds=config.QUEUE_REFRESH_INTERVAL
+            )
+        if "STATUS_RECONCILE_INTERVAL" in changed:
+            status_reconcile_task.change_interval(
+                seconds=config.STATUS_RECONCILE_INTERVAL
+            )
+        if "AUTOCOMPLETE_REFRESH_INTERVAL" in changed:
+            library_task.change_interval(
+                seconds=config.AUTOCOMPLETE_REFRESH_INTERVAL
+            )
+        if (
+            "JELLYFIN_POOL_REFILL_INTERVAL" in changed
+            and account_pool_task.is_running()
+        ):
+            account_pool_task.change_interval(
+                seconds=config.JELLYFIN_POOL_REFILL_INTERVAL
+            )
+
+        restart_needed = changed & RESTART_SETTINGS
+        if restart_needed:
+            config.LOG.warning(
+                "Restart the bot to apply the new"
+                f" {', '.join(sorted(restart_needed))}"
+            )
+
+    async def close(self):
+        # Hands the lease over right away, stopping the leader's tasks
+        if self.leader:
+            await self.leader.stop()
+        else:
+            self.stop_leader_tasks()
+        if self.services:
+            self.services.stop()
+        if self.diagnostics:
+            self.diagnostics.stop()
+        await super().close()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        if self.http_client:
+            await self.http_client.close()
+        await close_database()
+
+
+def start_loop(loop: tasks.Loop) -> None:
+    """
+    Start a task loop, waiting for it to finish first if it was just
+    cancelled
+
+    Args:
+        loop (tasks.Loop): The task loop to start
+    """
+    if loop.is_running():
+        loop.restart()
+    else:
+        loop.start()
 
 
-@bot.event
-async def on_ready():
-    config.LOG.info(f"{bot.user} has connected to Discord.")
+# Created once the config has been loaded, since it sets up the shards
+bot = None
+
+
+@tasks.loop(seconds=30)
+async def queue_refresh_task():
+    for service in ("radarr", "sonarr"):
+        if not bot.services.is_available(service):
+            continue
+        try:
+            await bot.queue_cache.refresh(service)
+        except Exception as e:
+            config.LOG.error(f"Failed refreshing the {service} queue: {e}")
 
 
 @tasks.loop(minutes=1)
-async def delete_accounts_task():
-    from utils.jellyfin_delete import delete_accounts
+async def status_reconcile_task():
+    try:
+        await bot.status_reconciler.sync()
+    except Exception as e:
+        config.LOG.error(f"Failed syncing the request statuses: {e}")
+
+
+@tasks.loop(minutes=10)
+async def library_task():
+    for service, host, headers in (
+        ("radarr", config.RADARR_HOST_URL, config.RADARR_HEADERS),
+        ("sonarr", config.SONARR_HOST_URL, config.SONARR_HEADERS),
+    ):
+        if not bot.services.is_available(service):
+            continue
+        try:
+            status, library = await bot.http_client.get(
+                service,
+                f"{host}/api/v3/{'movie' if service == 'radarr' else 'series'}",
+                headers=headers,
+            )
+            if status != 200:
+                raise Exception(f"{service} returned {status}")
+            bot.library.sync(service, library)
+            bot.title_index.sync(service, library)
+        except Exception as e:
+            config.LOG.error(f"Failed refreshing the {service} library: {e}")
+
+
+@tasks.loop(minutes=1)
+async def account_pool_task():
+    try:
+        await bot.account_pool.refill()
+    except Exception as e:
+        config.LOG.error(f"Failed refilling the Jellyfin account pool: {e}")
+
+
+@tasks.loop(seconds=CONFIG_POLL_INTERVAL)
+async def config_reload_task():
+    try:
+        mtime = os.stat(config.config_path()).st_mtime
+    except OSError:
+        return
+    if mtime == bot.config_mtime:
+        return
 
-    Base.metadata.create_all(bind=engine)
-    delete_accounts()
+    bot.config_mtime = mtime
+    changed = config.reload_config()
+    if changed:
+        try:
+            await bot.apply_config(changed)
+        except Exception as e:
+            config.LOG.error(f"Failed applying the reloaded config: {e}")
 
 
 if __name__ == "__main__":
     config.load_config()
+    bot = MyBot()
+    bot.remove_command("help")
     bot.run(config.BOT_TOKEN)
@@ -6,7 +6,8 @@ from discord import app_commands
 class slash_handlers(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        bot.tree.on_error = self.on_error
+        # Failed commands are still recorded by the tree before this runs
+        bot.tree.error_handler = self.on_error
 
     async def on_error(self, interaction: discord.Interaction, error):
         if (
@@ -2,14 +2,9 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
-from utils.database import Session
 from utils.jellyfin_create import create_jellyfin_account
-from utils.models import JellyfinAccounts
-from utils.config import (
-    JELLYFIN_PUBLIC_URL,
-    JELLYFIN_ENABLED,
-    ACCOUNT_TIME,
-)
+from utils.repository import get_user_account
+import utils.config as config
 
 
 class NewAccount(commands.Cog):
@@ -17,18 +12,23 @@ class NewAccount(commands.Cog):
         self.bot = bot
 
     @app_commands.command()
-    @app_commands.check(lambda inter: JELLYFIN_ENABLED)
+    @app_commands.check(lambda inter: config.JELLYFIN_ENABLED)
     async def newaccount(self, interaction: discord.Interaction) -> None:
         """Create a new temporary Jellyfin account"""
         # Defer in case it takes too long
         await interaction.response.defer(ephemeral=True)
-        # Make sure the user doesn't already have an account
-        with Session() as session:
-            account = (
-                session.query(JellyfinAccounts)
-                .filter(JellyfinAccounts.user_id == interaction.user.id)
-                .first()
+        if not self.bot.services.is_available("jellyfin"):
+            embed = discord.Embed(
+                title="Service Unavailable",
+                description=(
+                    "Jellyfin can't be reached right now. Please try again"
+                    " later."
+                ),
+                color=0xD01B86,
             )
+            return await interaction.followup.send(embed=embed)
+        # Make sure the user doesn't already have an account
+        account = await get_user_account(interaction.user.id)
         # Account already allocated
         if account:
             embed = discord.Embed(
@@ -42,9 +42,18 @@ class NewAccount(commands.Cog):
             )
             return await interaction.followup.send(embed=embed)
 
-        # Create a new Jellyfin account for the user
-        response = create_jellyfin_account(interaction.user.id)
+        # Hand out a pre-created account, creating one if the pool is empty
+        response = None
+        if self.bot.account_pool:
+            response = await self.bot.account_pool.claim(interaction.user.id)
+        if not response:
+            response = await create_jellyfin_account(
+                interaction.user.id, self.bot.http_client
+            )
         if response:
+            # Make sure the new account gets scheduled for deletion
+            if self.bot.expiry_scheduler:
+                self.bot.expiry_scheduler.wake()
             embed = discord.Embed(
                 title="Account Created",
                 description=(
@@ -61,11 +70,11 @@ class NewAccount(commands.Cog):
                 description=(
                     # fmt: off
                     "Here is your temporary account information.\n\n"
-                    f"**Server URL:** `{JELLYFIN_PUBLIC_URL}`\n"
+                    f"**Server URL:** `{config.JELLYFIN_PUBLIC_URL}`\n"
                     f"**Username:** `{response[0]}`\n"
                     f"**Password:** `{response[1]}`\n\n"
                     "Your account will be automatically deleted in"
-                    f" {ACCOUNT_TIME} hours."
+                    f" {config.ACCOUNT_TIME} hours."
                     # fmt: on
                 ),
                 color=0xD01B86,
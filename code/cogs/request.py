@@ -1,29 +1,60 @@
 import discord
+import csv
+import io
 from discord import app_commands
 from discord.ext import commands
 from typing import Literal
 
-from utils.content_get import get_content
-from utils.content_view import AddContentView
-from utils.config import (
-    RADARR_HOST_URL,
-    RADARR_HEADERS,
-    RADARR_ROOT_FOLDER_PATH,
-    RADARR_QUALITY_PROFILE_ID,
-    SONARR_HOST_URL,
-    SONARR_HEADERS,
-    SONARR_ROOT_FOLDER_PATH,
-    SONARR_QUALITY_PROFILE_ID,
+from utils.content_get import (
+    get_content,
+    get_content_by_id,
+    parse_content_id,
 )
+from utils.content_bulk import bulk_add_content
+from utils.content_view import AddContentView
+from utils.paginated_view import PaginatedView
+import utils.config as config
+
+BULK_REQUEST_LIMIT = 100
+BULK_RESULTS_PER_PAGE = 15
 
 
 class Request(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def service_unavailable(
+        self, interaction: discord.Interaction, service: str
+    ) -> bool:
+        """
+        Let the user know if a service failed its last check
+
+        Args:
+            interaction (discord.Interaction): The deferred interaction
+            service (str): The service the content would be requested from
+
+        Returns:
+            bool: Whether or not the service is unavailable
+        """
+        if self.bot.services.is_available(service):
+            return False
+
+        embed = discord.Embed(
+            title="Service Unavailable",
+            description=(
+                f"{service.capitalize()} can't be reached right now. Please"
+                " try again later."
+            ),
+            color=0xD01B86,
+        )
+        await interaction.followup.send(embed=embed, ephemeral=True)
+        return True
+
     @app_commands.command()
     @app_commands.describe(form="Are you requesting a Movie or Show?")
-    @app_commands.describe(name="Name of the content")
+    @app_commands.describe(
+        name="Name of the content, or its tmdb: (movie) or tvdb: (show) ID"
+    )
     async def request(
         self,
         interaction: discord.Interaction,
@@ -33,16 +64,69 @@ class Request(commands.Cog):
         """Request a movie or tv show to be added to the library"""
         # Could take a sec. so defer the response
         await interaction.response.defer(ephemeral=True)
-        # Get matching content from relevant service
+        if await self.service_unavailable(
+            interaction, "radarr" if form == "Movie" else "sonarr"
+        ):
+            return
         if form == "Movie":
-            content_data = get_content(
-                name, "radarr", RADARR_HOST_URL, RADARR_HEADERS
+            service, host, headers = (
+                "radarr",
+                config.RADARR_HOST_URL,
+                config.RADARR_HEADERS,
             )
         else:
-            content_data = get_content(
-                name, "sonarr", SONARR_HOST_URL, SONARR_HEADERS
+            service, host, headers = (
+                "sonarr",
+                config.SONARR_HOST_URL,
+                config.SONARR_HEADERS,
+            )
+        content_id = parse_content_id(name, service)
+        if content_id == "WRONG ID TYPE":
+            embed = discord.Embed(
+                title="Wrong ID Type",
+                description=(
+                    "Movies are requested by their `tmdb:` ID, and shows by"
+                    " their `tvdb:` ID."
+                ),
+                color=0xD01B86,
+            )
+            return await interaction.followup.send(embed=embed, ephemeral=True)
+        # Content requested by ID doesn't need to be searched for
+        if content_id is not None:
+            content_data = await get_content_by_id(
+                content_id,
+                service,
+                host,
+                headers,
+                self.bot.http_client,
+                self.bot.lookup_cache,
+                self.bot.library,
+            )
+            if isinstance(content_data, dict):
+                content_data = [content_data]
+        # Get matching content from relevant service
+        else:
+            content_data = await get_content(
+                name,
+                service,
+                host,
+                headers,
+                self.bot.http_client,
+                self.bot.lookup_cache,
+                self.bot.library,
             )
 
+        if content_data == "LOOKUP FAILED":
+            embed = discord.Embed(
+                title="Search Failed",
+                description=(
+                    f"{service.capitalize()} failed to search for **{name}**."
+                    " Please try again later."
+                ),
+                color=0xD01B86,
+            )
+            return await interaction.followup.send(embed=embed, ephemeral=True)
+
         if content_data == "NO RESULTS":
             embed = discord.Embed(
                 title="No Results",
@@ -72,6 +156,14 @@ class Request(commands.Cog):
             )
             return await interaction.followup.send(embed=embed, ephemeral=True)
 
+        # Make the results available to autocomplete
+        for content in content_data:
+            self.bot.title_index.add(
+                "radarr" if form == "Movie" else "sonarr",
+                content["title"],
+                content["year"],
+            )
+
         embed = discord.Embed(
             title="Results Found",
             description=(
@@ -86,23 +178,152 @@ class Request(commands.Cog):
             view = AddContentView(
                 content_data,
                 "radarr",
-                RADARR_HOST_URL,
-                RADARR_HEADERS,
-                RADARR_ROOT_FOLDER_PATH,
-                RADARR_QUALITY_PROFILE_ID,
+                config.RADARR_HOST_URL,
+                config.RADARR_HEADERS,
+                config.RADARR_ROOT_FOLDER_PATH,
+                config.RADARR_QUALITY_PROFILE_ID,
             )
         else:
             view = AddContentView(
                 content_data,
                 "sonarr",
-                SONARR_HOST_URL,
-                SONARR_HEADERS,
-                SONARR_ROOT_FOLDER_PATH,
-                SONARR_QUALITY_PROFILE_ID,
+                config.SONARR_HOST_URL,
+                config.SONARR_HEADERS,
+                config.SONARR_ROOT_FOLDER_PATH,
+                config.SONARR_QUALITY_PROFILE_ID,
             )
 
         await interaction.followup.send(embed=embed, view=view, ephemeral=True)
 
+    @request.autocomplete("name")
+    async def name_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> list[app_commands.Choice[str]]:
+        # Only suggest titles for the chosen form, both if not chosen yet
+        form = interaction.namespace.form
+        if form == "Movie":
+            services = ["radarr"]
+        elif form == "Show":
+            services = ["sonarr"]
+        else:
+            services = ["radarr", "sonarr"]
+
+        matches = []
+        for service in services:
+            matches += self.bot.title_index.search(service, current)
+
+        return [
+            app_commands.Choice(name=display[:100], value=value[:100])
+            for display, value in matches[:25]
+        ]
+
+    @app_commands.command(name="request-bulk")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(form="Are you requesting Movies or Shows?")
+    @app_commands.describe(
+        titles="Titles or tmdb: (movie) / tvdb: (show) IDs, split by ';'"
+    )
+    @app_commands.describe(
+        file="A text file with one title or ID per line, or a CSV file"
+    )
+    async def request_bulk(
+        self,
+        interaction: discord.Interaction,
+        form: Literal["Movie", "Show"],
+        titles: str = None,
+        file: discord.Attachment = None,
+    ) -> None:
+        """Request many movies or tv shows to be added to the library at once"""
+        await interaction.response.defer(ephemeral=True)
+        if await self.service_unavailable(
+            interaction, "radarr" if form == "Movie" else "sonarr"
+        ):
+            return
+
+        entries = []
+        if titles:
+            entries += titles.split(";")
+        if file:
+            contents = (await file.read()).decode("utf-8", errors="ignore")
+            if file.filename.lower().endswith(".csv"):
+                # Titles/IDs are taken from the first column
+                entries += [
+                    row[0] for row in csv.reader(io.StringIO(contents)) if row
+                ]
+            else:
+                entries += contents.splitlines()
+        entries = [entry.strip() for entry in entries if entry.strip()]
+
+        if not entries or len(entries) > BULK_REQUEST_LIMIT:
+            embed = discord.Embed(
+                title="Invalid Bulk Request",
+                description=(
+                    f"Provide between 1 and {BULK_REQUEST_LIMIT} titles or"
+                    " IDs, either separated by semicolons or in a file with"
+                    " one per line."
+                ),
+                color=0xD01B86,
+            )
+            return await interaction.followup.send(embed=embed, ephemeral=True)
+
+        if form == "Movie":
+            results = await bulk_add_content(
+                entries,
+                "radarr",
+                config.RADARR_HOST_URL,
+                config.RADARR_HEADERS,
+                config.RADARR_ROOT_FOLDER_PATH,
+                config.RADARR_QUALITY_PROFILE_ID,
+                interaction.user.id,
+                self.bot.http_client,
+                self.bot.lookup_cache,
+                config.HTTP_POOL_SIZE,
+                self.bot.library,
+            )
+        else:
+            results = await bulk_add_content(
+                entries,
+                "sonarr",
+                config.SONARR_HOST_URL,
+                config.SONARR_HEADERS,
+                config.SONARR_ROOT_FOLDER_PATH,
+                config.SONARR_QUALITY_PROFILE_ID,
+                interaction.user.id,
+                self.bot.http_client,
+                self.bot.lookup_cache,
+                config.HTTP_POOL_SIZE,
+                self.bot.library,
+            )
+
+        added = sum(1 for _, status in results if status == "ADDED")
+        embeds = []
+        for i in range(0, len(results), BULK_RESULTS_PER_PAGE):
+            embed = discord.Embed(
+                title="Bulk Request Results",
+                description=(
+                    f"Added {added} of {len(results)} requested"
+                    f" {'movies' if form == 'Movie' else 'shows'}:\n"
+                ),
+                color=0xD01B86,
+            )
+            for label, status in results[i : i + BULK_RESULTS_PER_PAGE]:
+                embed.description += f"\n**{label}** - Status: `{status}`"
+            embed.set_footer(
+                text=(
+                    f"Page {i // BULK_RESULTS_PER_PAGE + 1} of"
+                    f" {len(range(0, len(results), BULK_RESULTS_PER_PAGE))}"
+                )
+            )
+            embeds.append(embed)
+
+        if len(embeds) == 1:
+            return await interaction.followup.send(
+                embed=embeds[0], ephemeral=True
+            )
+        await interaction.followup.send(
+            embed=embeds[0], view=PaginatedView(embeds), ephemeral=True
+        )
+
 
 async def setup(bot):
     await bot.add_cog(Request(bot))
@@ -1,16 +1,14 @@
 import discord
+import datetime
 from discord import app_commands
 from discord.ext import commands
-import requests
 
-from utils.models import Requests
-from utils.database import Session
-from utils.config import (
-    RADARR_HOST_URL,
-    RADARR_HEADERS,
-    SONARR_HOST_URL,
-    SONARR_HEADERS,
-)
+from utils.repository import get_user_requests, delete_user_requests
+from utils.status_view import StatusPages, StatusView
+import utils.config as config
+
+# Number of requests shown on each page of `/status`
+STATUS_PAGE_SIZE = 10
 
 
 class Status(commands.Cog):
@@ -23,18 +21,7 @@ class Status(commands.Cog):
         # Defer the response
         await interaction.response.defer(ephemeral=True)
 
-        with Session() as session:
-            requested_content = (
-                session.query(
-                    Requests.title,
-                    Requests.release_year,
-                    Requests.local_id,
-                    Requests.tmdbid,
-                    Requests.tvdbid,
-                )
-                .filter(Requests.user_id == interaction.user.id)
-                .all()
-            )
+        requested_content = await get_user_requests(interaction.user.id)
 
         # No content requested
         if len(requested_content) == 0:
@@ -48,174 +35,160 @@ class Status(commands.Cog):
             )
             return await interaction.followup.send(embed=embed)
 
-        # Create template embed
-        embed = discord.Embed(
-            title="Requested Content",
-            description=(
-                "Below are the movies/shows you have requested that are"
-                " currently being downloaded:\n"
-            ),
-            color=0xD01B86,
+        # The status stored with the requests is shown right away, unless
+        # it is out of date, in which case it is checked once shown
+        requests = self.unpack_content(requested_content)
+        pages = StatusPages(requests, self.resolve, STATUS_PAGE_SIZE)
+        # Finished requests are only forgotten once the user has seen them
+        view = StatusView(
+            pages,
+            lambda shown: self.forget_downloaded(shown, interaction.user.id),
         )
+        embed = await view.render()
 
-        # Unpack the content
-        radarr_content_info, sonarr_content_info = self.unpack_content(
-            requested_content
-        )
-        # Get the descriptions and local IDs found in queue
-        radarr_desc, radarr_added_ids = self.process_queue(
-            radarr_content_info, "radarr"
-        )
-        sonarr_desc, sonarr_added_ids = self.process_queue(
-            sonarr_content_info, "sonarr"
-        )
-
-        added_ids = radarr_added_ids + sonarr_added_ids
-        # Get the description of content not in the queue
-        non_queue_desc = self.get_non_queue_content(
-            requested_content, added_ids, interaction.user.id
-        )
-
-        embed.description += radarr_desc + sonarr_desc + non_queue_desc
+        # Send the follow-up message, with pages if there are too many
+        # requests to fit on one
+        if len(requests) > STATUS_PAGE_SIZE:
+            await interaction.followup.send(embed=embed, view=view)
+        else:
+            view.stop()
+            await interaction.followup.send(embed=embed)
 
-        # Send the follow-up message
-        await interaction.followup.send(embed=embed)
+        await view.on_shown()
 
-    def unpack_content(self, requested_content: list) -> tuple:
+    def unpack_content(self, requested_content: list) -> list:
         """
-        Given a list of requested content, unpack it into two dictionaries
+        Given a list of requested content, describe the requests whose
+        stored status is recent enough. Downloads are listed first
 
         Args:
             requested_content (list): A list of requested content
 
         Returns:
-            tuple: A tuple of two dictionaries
+            list: A dict for each request, with the line describing it and
+                its category set if its status is recent enough
         """
-
-        radarr_content_info = {}
-        sonarr_content_info = {}
-
+        now = datetime.datetime.now()
+        max_age = datetime.timedelta(seconds=config.STATUS_MAX_AGE)
+        queued = []
+        non_queued = []
         for content in requested_content:
-            title, release_year, local_id, tmdbid, tvdbid = content
-            if tmdbid is not None:
-                radarr_content_info[local_id] = {
-                    "title": title,
-                    "release_year": release_year,
-                    "tmdbid": tmdbid,
-                }
+            (
+                title,
+                release_year,
+                local_id,
+                tmdbid,
+                _,
+                state,
+                progress,
+                time_left,
+                percent_of_episodes,
+                last_checked,
+            ) = content
+            request = {
+                "title": title,
+                "release_year": release_year,
+                "service": "radarr" if tmdbid is not None else "sonarr",
+                "local_id": local_id,
+                "state": state,
+                "progress": progress,
+                "time_left": time_left,
+                "percent_of_episodes": percent_of_episodes,
+                "line": None,
+                "category": None,
+            }
+            # Requests never checked by the reconciler are checked once shown
+            if last_checked is not None and now - last_checked <= max_age:
+                self.describe(request)
+            if state == "DOWNLOADING":
+                queued.append(request)
             else:
-                sonarr_content_info[local_id] = {
-                    "title": title,
-                    "release_year": release_year,
-                    "tvdbid": tvdbid,
-                }
+                non_queued.append(request)
 
-        return radarr_content_info, sonarr_content_info
+        return queued + non_queued
 
-    def process_queue(self, content_info: dict, service: str) -> str:
+    def describe(self, request: dict) -> None:
         """
-        Given a dictionary of requested content and "sonarr"/"radarr", process the queue
+        Set the line describing a request, and the category it is filtered
+        by, from its status
 
         Args:
-            content_info (dict): A dictionary of content information
-            service (str): The service to check the queue of
+            request (dict): The request
+        """
+        label = f"\n**{request['title']} ({request['release_year']})**"
+        state = request["state"]
+        # If the content requested by the user is being downloaded
+        if state == "DOWNLOADING":
+            try:
+                time_left = self.process_time(request["time_left"])
+            except (AttributeError, ValueError):
+                time_left = "Unknown"
+            request["line"] = f"{label} - Time Left: `{time_left}`"
+            if request["progress"] is not None:
+                request["line"] += f" ({int(request['progress'] * 100)}%)"
+            request["category"] = "queued"
+        # If series and only a portion of episodes have been downloaded
+        elif request["percent_of_episodes"] is not None and state in (
+            "NOT FOUND",
+            "PARTIAL",
+        ):
+            request["line"] = (
+                f"{label} - Status: `{state}"
+                f" ({int(request['percent_of_episodes'])}% of eps.)`"
+            )
+            request["category"] = (
+                "partial" if state == "PARTIAL" else "not_found"
+            )
+        else:
+            request["line"] = f"{label} - Status: `{state or 'NOT FOUND'}`"
+            request["category"] = (
+                "not_found" if state in (None, "NOT FOUND") else "other"
+            )
 
-        Returns:
-            str: The description of the embed
+    async def resolve(self, requests: list) -> None:
         """
+        Check the status of requests whose stored status is out of date
 
-        description = ""
-        added_ids = []
-
-        queue = requests.get(
-            f"{RADARR_HOST_URL if service == 'radarr' else SONARR_HOST_URL}/api/v3/queue",
-            headers=RADARR_HEADERS if service == "radarr" else SONARR_HEADERS,
-        ).json()
-
-        for download in queue["records"]:
-            id_str = "movieId" if service == "radarr" else "seriesId"
-            # If the content was requested by the user
-            if (
-                int(download[id_str]) in content_info.keys()
-                and int(download[id_str]) not in added_ids
-            ):
-                # Append local ID
-                added_ids.append(int(download[id_str]))
-                # Add the download to the embed
-                try:
-                    time_left = self.process_time(download["timeleft"])
-                except KeyError:
-                    time_left = "Unknown"
-                description += (
-                    f"\n**{content_info[int(download[id_str])]['title']} ({content_info[int(download[id_str])]['release_year']})**"
-                    f" - Time Left: `{time_left}`"
-                )
-
-        return description, added_ids
-
-    def get_non_queue_content(
-        self, requested_content: list, added_ids: list, user_id: int
-    ) -> str:
+        Args:
+            requests (list): The requests to check
+        """
+        statuses = await self.bot.status_reconciler.reconcile(
+            [(request["service"], request["local_id"]) for request in requests]
+        )
+        statuses = {
+            (status["service"], status["local_id"]): status
+            for status in statuses
+        }
+        for request in requests:
+            # Content that couldn't be checked keeps its previous status
+            status = statuses.get((request["service"], request["local_id"]))
+            if status is not None:
+                for field in (
+                    "state",
+                    "progress",
+                    "time_left",
+                    "percent_of_episodes",
+                ):
+                    request[field] = status[field]
+            self.describe(request)
+
+    async def forget_downloaded(self, requests: list, user_id: int) -> None:
         """
-        Given a list of requested content and a list of added IDs, return a description of content not in the queue
+        Remove the requests of content that finished downloading or was
+        removed from the library, once they have been shown to the user
 
         Args:
-            requested_content (list): A list of requested content
-            added_ids (list): A list of IDs that are in the queue
+            requests (list): The requests shown to the user
             user_id (int): The ID of the user
-
-        Returns:
-            str: A description of content not in the queue
         """
-
-        description = ""
-        # For evry piece of content not in the queue, check if it has a file
-        for content in requested_content:
-            title, release_year, local_id, tmdbid, _ = content
-            # If not in queue
-            if local_id not in added_ids:
-                # Pull the movie data from the service
-                if tmdbid is not None:
-                    data = requests.get(
-                        f"{RADARR_HOST_URL}/api/v3/movie/{local_id}",
-                        headers=RADARR_HEADERS,
-                    ).json()
-                else:
-                    data = requests.get(
-                        f"{SONARR_HOST_URL}/api/v3/series/{local_id}",
-                        headers=SONARR_HEADERS,
-                    ).json()
-
-                # If the movie has a file, then it has finished downloading
-                if data.get("hasFile", True):
-                    # Remove from database
-                    with Session() as session:
-                        request = (
-                            session.query(Requests)
-                            .filter(Requests.user_id == user_id)
-                            .filter(Requests.local_id == local_id)
-                            .first()
-                        )
-                        session.delete(request)
-                        session.commit()
-
-                # If series and only a portion of episodes have been downloaded
-                # If data["statistics"] exists and is not None
-                if "statistics" in data and data["statistics"] != None:
-                    if "percentOfEpisodes" in data["statistics"]:
-                        description += (
-                            f"\n**{title} ({release_year})** - Status: `NOT"
-                            " FOUND"
-                            f" ({int(data['statistics']['percentOfEpisodes'])}%"
-                            " of eps.)`"
-                        )
-                # All other scenarios, download not found
-                else:
-                    description += (
-                        f"\n**{title} ({release_year})** - Status: `NOT FOUND`"
-                    )
-
-        return description
+        finished = [
+            (request["service"], request["local_id"])
+            for request in requests
+            if request["state"] in ("DOWNLOADED", "REMOVED")
+        ]
+        # Remove all finished content from the database at once
+        if finished:
+            await delete_user_requests(user_id, finished)
 
     def process_time(self, time) -> str:
         """
@@ -1,3 +1,4 @@
+import asyncio
 from discord.ext import commands
 from discord import Object
 
@@ -30,6 +31,43 @@ class TreeSync(commands.Cog):
         else:
             await ctx.author.send("That is not a valid guild ID")
 
+    @commands.command()
+    @commands.dm_only()
+    @commands.is_owner()
+    async def diagnostics(
+        self, ctx: commands.Context, seconds: int = None
+    ) -> None:
+        monitor = self.bot.diagnostics
+        if monitor is None:
+            await ctx.author.send(
+                "Diagnostics are disabled. Add a `diagnostics` section to"
+                " `config.yaml` or set `CORDARR_DIAGNOSTICS=1` and restart."
+            )
+            return
+
+        lines = [
+            f"Event loop stalls over {monitor.threshold * 1000:.0f} ms"
+            " (stalls, seconds blocked):"
+        ]
+        for command, call_site, stalls, blocked in monitor.top_offenders():
+            lines.append(
+                f"{stalls:>5} {blocked:>8.2f}s {command} @ {call_site}"
+            )
+        if len(lines) == 1:
+            lines.append("None so far")
+
+        if seconds:
+            await ctx.author.send(f"Profiling for {seconds} seconds...")
+            samples = await asyncio.to_thread(monitor.profile, seconds)
+            lines.append(
+                f"\nSampled for {seconds} seconds (share of samples):"
+            )
+            for command, call_site, share in samples[:10]:
+                lines.append(f"{share:>6.1%} {command} @ {call_site}")
+
+        # Stay within Discord's message length limit
+        await ctx.author.send("```\n" + "\n".join(lines)[:1950] + "\n```")
+
 
 async def setup(bot):
     await bot.add_cog(TreeSync(bot))
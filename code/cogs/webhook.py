@@ -0,0 +1,146 @@
+import asyncio
+import discord
+import hmac
+from discord.ext import commands
+from aiohttp import web, BasicAuth
+
+from utils.repository import (
+    pop_content_requests,
+    set_content_state,
+    set_content_statuses,
+)
+import utils.config as config
+
+
+class Webhook(commands.Cog):
+    """
+    Receive Radarr/Sonarr webhook events so request states are pushed to
+    the bot instead of being polled for by `/status`
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.runner = None
+
+    async def cog_load(self) -> None:
+        if not config.WEBHOOK_ENABLED:
+            return
+
+        app = web.Application()
+        app.router.add_post("/webhook", self.handle_event)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(
+            self.runner, config.WEBHOOK_HOST, config.WEBHOOK_PORT
+        ).start()
+        config.LOG.info(
+            f"Listening for webhooks on {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}"
+        )
+
+    async def cog_unload(self) -> None:
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def handle_event(self, request: web.Request) -> web.Response:
+        """
+        Handle a single Radarr/Sonarr webhook event
+
+        Args:
+            request (web.Request): The webhook request
+
+        Returns:
+            web.Response: The response sent back to Radarr/Sonarr
+        """
+        try:
+            auth = BasicAuth.decode(request.headers["Authorization"])
+        except (KeyError, ValueError):
+            auth = None
+        if auth is None or not hmac.compare_digest(
+            auth.password.encode(), config.WEBHOOK_PASSWORD.encode()
+        ):
+            return web.Response(status=401)
+
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        if "movie" in payload:
+            service, local_id = "radarr", payload["movie"]["id"]
+        elif "series" in payload:
+            service, local_id = "sonarr", payload["series"]["id"]
+        # Test events and events unrelated to requested content
+        else:
+            return web.Response(status=204)
+
+        event_type = payload.get("eventType")
+        # Keep the library mirror up to date between refreshes
+        if event_type in ("MovieAdded", "SeriesAdd"):
+            content = payload.get("movie") or payload.get("series")
+            content_id = self.bot.library.external_id(service, content)
+            if content_id:
+                self.bot.library.add(service, content_id, local_id)
+        elif event_type in ("MovieDelete", "SeriesDelete"):
+            content = payload.get("movie") or payload.get("series")
+            content_id = self.bot.library.external_id(service, content)
+            if content_id:
+                self.bot.library.remove(service, content_id)
+        elif event_type == "Grab":
+            await set_content_state(service, local_id, "GRABBED")
+        elif event_type in ("Download", "ImportComplete"):
+            await self.complete(service, local_id)
+
+        return web.Response(status=204)
+
+    async def complete(self, service: str, local_id: int) -> None:
+        """
+        Mark content as downloaded, removing the requests for it and letting
+        the requesters know
+
+        Args:
+            service (str): The service the content belongs to
+            local_id (int): The ID of the content in Radarr/Sonarr
+        """
+        # Shows import episode by episode, so only finish once every episode
+        # has been downloaded
+        if service == "sonarr":
+            try:
+                await self.bot.queue_cache.refresh(service)
+            except Exception as e:
+                config.LOG.error(f"Failed refreshing the {service} queue: {e}")
+            status = await self.bot.status_reconciler.check(
+                service,
+                local_id,
+                await self.bot.queue_cache.get(service),
+                asyncio.Semaphore(1),
+            )
+            if status is None:
+                return
+            if status["state"] != "DOWNLOADED":
+                await set_content_statuses(service, [status])
+                return
+
+        requests = await pop_content_requests(service, local_id)
+
+        for title, user_id in requests:
+            embed = discord.Embed(
+                title="Content Downloaded",
+                description=(
+                    f"**{title}**, which you requested, has finished"
+                    " downloading and is now available."
+                ),
+                color=0xD01B86,
+            )
+            try:
+                user = self.bot.get_user(user_id) or await self.bot.fetch_user(
+                    user_id
+                )
+                await user.send(embed=embed)
+            except discord.HTTPException:
+                config.LOG.error(
+                    f"Failed sending download notice to user {user_id}"
+                )
+
+
+async def setup(bot):
+    await bot.add_cog(Webhook(bot))
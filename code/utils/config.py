@@ -3,10 +3,8 @@ import yaml
 import sys
 import os
 import logging
-import requests
 from colorlog import ColoredFormatter
 
-
 log_level = logging.DEBUG
 log_format = (
     "  %(log_color)s%(levelname)-8s%(reset)s |"
@@ -44,6 +42,54 @@ JELLYFIN_HEADERS = None
 ACCOUNT_TIME = None
 SIMPLE_PASSWORDS = False
 JELLYFIN_PUBLIC_URL = None
+JELLYFIN_MAX_CONCURRENT_CREATIONS = 3
+JELLYFIN_POOL_SIZE = 0
+JELLYFIN_POOL_REFILL_INTERVAL = 60
+JELLYFIN_RECONCILE_INTERVAL = 3600
+JELLYFIN_DELETE_ORPHANS = False
+
+HTTP_POOL_SIZE = 10
+HTTP_TIMEOUT = 30
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_KEEPALIVE_TIMEOUT = 60
+
+QUEUE_REFRESH_INTERVAL = 30
+QUEUE_PAGE_SIZE = 250
+STATUS_RECONCILE_INTERVAL = 60
+STATUS_MAX_AGE = 300
+STATUS_FULL_RECONCILE_INTERVAL = 3600
+
+LOOKUP_CACHE_SIZE = 256
+LOOKUP_CACHE_TTL = 600
+
+AUTOCOMPLETE_REFRESH_INTERVAL = 600
+
+WEBHOOK_ENABLED = False
+WEBHOOK_HOST = "0.0.0.0"
+WEBHOOK_PORT = 8585
+WEBHOOK_PASSWORD = None
+METRICS_ENABLED = False
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9095
+DIAGNOSTICS_ENABLED = False
+DIAGNOSTICS_SLOW_CALLBACK_DURATION = 0.1
+SERVICE_CHECK_TIMEOUT = 10
+SERVICE_CHECK_INTERVAL = 60
+SHARD_COUNT = 1
+SHARD_IDS = None
+LEADER_LEASE = 30
+
+DATABASE_URL = "sqlite+aiosqlite:///data/cordarr.db"
+DATABASE_POOL_SIZE = 5
+DATABASE_MAX_OVERFLOW = 10
+DATABASE_POOL_RECYCLE = 1800
+
+# Settings left out of a reloaded config file go back to these values
+DEFAULTS = {
+    name: value
+    for name, value in globals().items()
+    if name.isupper() and name != "LOG"
+}
 
 schema = {
     "type": "object",
@@ -91,6 +137,17 @@ schema = {
                 "account_time": {"type": "integer"},
                 "simple_passwords": {"type": "boolean"},
                 "public_url": {"type": "string"},
+                "max_concurrent_creations": {"type": "integer", "minimum": 1},
+                "pool_size": {"type": "integer", "minimum": 0},
+                "pool_refill_interval": {
+                    "type": "number",
+                    "exclusiveMinimum": 0,
+                },
+                "reconcile_interval": {
+                    "type": "number",
+                    "exclusiveMinimum": 0,
+                },
+                "delete_orphans": {"type": "boolean"},
             },
             "required": [
                 "url",
@@ -100,20 +157,115 @@ schema = {
                 "public_url",
             ],
         },
+        "http": {
+            "type": "object",
+            "properties": {
+                "pool_size": {"type": "integer", "minimum": 1},
+                "timeout": {"type": "number", "exclusiveMinimum": 0},
+                "connect_timeout": {"type": "number", "exclusiveMinimum": 0},
+                "keepalive_timeout": {"type": "number", "minimum": 0},
+            },
+        },
+        "status": {
+            "type": "object",
+            "properties": {
+                "queue_refresh_interval": {"type": "integer", "minimum": 1},
+                "queue_page_size": {"type": "integer", "minimum": 1},
+                "reconcile_interval": {"type": "integer", "minimum": 1},
+                "max_age": {"type": "integer", "minimum": 0},
+                "full_reconcile_interval": {"type": "integer", "minimum": 1},
+            },
+        },
+        "lookup_cache": {
+            "type": "object",
+            "properties": {
+                "size": {"type": "integer", "minimum": 1},
+                "ttl": {"type": "integer", "minimum": 0},
+            },
+        },
+        "autocomplete": {
+            "type": "object",
+            "properties": {
+                "refresh_interval": {"type": "integer", "minimum": 1},
+            },
+        },
+        "webhook": {
+            "type": "object",
+            "properties": {
+                "host": {"type": "string"},
+                "port": {"type": "integer"},
+                "password": {"type": "string", "minLength": 1},
+            },
+            "required": ["password"],
+        },
+        "metrics": {
+            "type": "object",
+            "properties": {
+                "host": {"type": "string"},
+                "port": {"type": "integer"},
+            },
+        },
+        "service_check": {
+            "type": "object",
+            "properties": {
+                "timeout": {"type": "number", "exclusiveMinimum": 0},
+                "interval": {"type": "number", "exclusiveMinimum": 0},
+            },
+        },
+        "diagnostics": {
+            "type": "object",
+            "properties": {
+                "slow_callback_duration": {
+                    "type": "number",
+                    "exclusiveMinimum": 0,
+                },
+            },
+        },
+        "sharding": {
+            "type": "object",
+            "properties": {
+                "shard_count": {"type": "integer", "minimum": 1},
+                "shard_ids": {
+                    "type": "array",
+                    "items": {"type": "integer", "minimum": 0},
+                    "minItems": 1,
+                },
+                "leader_lease": {"type": "number", "exclusiveMinimum": 0},
+            },
+            "dependentRequired": {"shard_ids": ["shard_count"]},
+        },
+        "database": {
+            "type": "object",
+            "properties": {
+                "url": {"type": "string"},
+                "pool_size": {"type": "integer", "minimum": 1},
+                "max_overflow": {"type": "integer", "minimum": 0},
+                "pool_recycle": {"type": "integer"},
+            },
+        },
     },
     "required": ["bot_info", "radarr", "sonarr"],
 }
 
 
+def config_path() -> str:
+    """
+    Get the path of the config file
+
+    Returns:
+        str: The path of the config file
+    """
+    if os.path.exists("/.dockerenv"):
+        return "config/config.yaml"
+    return "config.yaml"
+
+
 def load_config() -> None:
     """
     Load the config file and validate it
     If the file does not exist, generate it
     """
-    if os.path.exists("/.dockerenv"):
-        file_path = "config/config.yaml"
-    else:
-        file_path = "config.yaml"
+    file_path = config_path()
 
     try:
         with open(file_path, "r") as f:
@@ -122,8 +274,7 @@ def load_config() -> None:
 
     except FileNotFoundError:
         with open(file_path, "w") as f:
-            f.write(
-                """
+            f.write("""
 bot_info:
     bot_token: YOUR_BOT_TOKEN
 
@@ -144,8 +295,7 @@ jellyfin:
     api_key: JELLYFIN_API_KEY
     account_time: ACCOUNT_ACTIVE_TIME
     simple_passwords: SIMPLE_OR_COMPLEX_PASSWORDS
-                """
-            )
+                """)
 
         sys.exit(
             LOG.critical(
@@ -155,22 +305,54 @@ jellyfin:
         )
 
 
-def validate_config(contents) -> None:
+def reload_config() -> set:
+    """
+    Re-read the config file and swap in its settings, keeping the current
+    settings if the file is invalid
+
+    Returns:
+        set: The names of the settings that changed, None if the file is
+            invalid
+    """
+    previous = {name: globals()[name] for name in DEFAULTS}
+    try:
+        with open(config_path(), "r") as f:
+            validate_config(f.read(), reloading=True)
+    except (OSError, yaml.YAMLError) as e:
+        LOG.error(f"Unable to reload config.yaml: {e}")
+        return None
+    except jsonschema.ValidationError as e:
+        LOG.error(f"Error in config.yaml, not reloading it: {e.message}")
+        return None
+
+    return {name for name in DEFAULTS if globals()[name] != previous[name]}
+
+
+def validate_config(contents, reloading: bool = False) -> None:
     """
     Validate the contents of the config file and assign variables
 
     Args:
         contents (str): The contents of the config file
+        reloading (bool): Whether the bot is already running, in which case
+            errors are raised instead of exiting
     """
-    global BOT_TOKEN, RADARR_HOST_URL, RADARR_ENABLED, RADARR_HEADERS, RADARR_ROOT_FOLDER_PATH, RADARR_QUALITY_PROFILE_ID, SONARR_ENABLED, SONARR_HOST_URL, SONARR_HEADERS, SONARR_ROOT_FOLDER_PATH, SONARR_QUALITY_PROFILE_ID, JELLYFIN_ENABLED, JELLYFIN_URL, JELLYFIN_HEADERS, ACCOUNT_TIME, SIMPLE_PASSWORDS, JELLYFIN_PUBLIC_URL
+    global BOT_TOKEN, RADARR_HOST_URL, RADARR_ENABLED, RADARR_HEADERS, RADARR_ROOT_FOLDER_PATH, RADARR_QUALITY_PROFILE_ID, SONARR_ENABLED, SONARR_HOST_URL, SONARR_HEADERS, SONARR_ROOT_FOLDER_PATH, SONARR_QUALITY_PROFILE_ID, JELLYFIN_ENABLED, JELLYFIN_URL, JELLYFIN_HEADERS, ACCOUNT_TIME, SIMPLE_PASSWORDS, JELLYFIN_PUBLIC_URL, JELLYFIN_MAX_CONCURRENT_CREATIONS, JELLYFIN_POOL_SIZE, JELLYFIN_POOL_REFILL_INTERVAL, JELLYFIN_RECONCILE_INTERVAL, JELLYFIN_DELETE_ORPHANS, HTTP_POOL_SIZE, HTTP_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_KEEPALIVE_TIMEOUT, QUEUE_REFRESH_INTERVAL, QUEUE_PAGE_SIZE, STATUS_RECONCILE_INTERVAL, STATUS_MAX_AGE, STATUS_FULL_RECONCILE_INTERVAL, LOOKUP_CACHE_SIZE, LOOKUP_CACHE_TTL, AUTOCOMPLETE_REFRESH_INTERVAL, WEBHOOK_ENABLED, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PASSWORD, METRICS_ENABLED, METRICS_HOST, METRICS_PORT, DIAGNOSTICS_ENABLED, DIAGNOSTICS_SLOW_CALLBACK_DURATION, SERVICE_CHECK_TIMEOUT, SERVICE_CHECK_INTERVAL, SHARD_COUNT, SHARD_IDS, LEADER_LEASE, DATABASE_URL, DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW, DATABASE_POOL_RECYCLE
 
     config = yaml.safe_load(contents)
 
     try:
         jsonschema.validate(config, schema)
     except jsonschema.ValidationError as e:
+        if reloading:
+            raise
         sys.exit(LOG.critical(f"Error in config.yaml: {e.message}"))
 
+    # Nothing can fail past this point, so the settings are swapped all at
+    # once (without yielding to the event loop)
+    if reloading:
+        globals().update(DEFAULTS)
+
     #
     # Begin validating values and assigning variables
     #
@@ -184,10 +366,8 @@ def validate_config(contents) -> None:
             "X-Api-Key": config["radarr"]["api_key"],
         }
         RADARR_ROOT_FOLDER_PATH = config["radarr"]["root_folder_path"]
-        # set radarr quality profile id
-        RADARR_QUALITY_PROFILE_ID = validate_profile(
-            "radarr", RADARR_HOST_URL, RADARR_HEADERS, config
-        )
+        # Checked against the available profiles once the bot starts
+        RADARR_QUALITY_PROFILE_ID = config["radarr"].get("quality_profile_id")
         RADARR_ENABLED = True
 
     if "sonarr" in config:
@@ -197,10 +377,8 @@ def validate_config(contents) -> None:
             "X-Api-Key": config["sonarr"]["api_key"],
         }
         SONARR_ROOT_FOLDER_PATH = config["sonarr"]["root_folder_path"]
-        # set sonarr quality profile id
-        SONARR_QUALITY_PROFILE_ID = validate_profile(
-            "sonarr", SONARR_HOST_URL, SONARR_HEADERS, config
-        )
+        # Checked against the available profiles once the bot starts
+        SONARR_QUALITY_PROFILE_ID = config["sonarr"].get("quality_profile_id")
         SONARR_ENABLED = True
 
     if "jellyfin" in config:
@@ -212,59 +390,101 @@ def validate_config(contents) -> None:
         ACCOUNT_TIME = config["jellyfin"]["account_time"]
         SIMPLE_PASSWORDS = config["jellyfin"]
         JELLYFIN_PUBLIC_URL = config["jellyfin"]["public_url"]
+        JELLYFIN_MAX_CONCURRENT_CREATIONS = config["jellyfin"].get(
+            "max_concurrent_creations", JELLYFIN_MAX_CONCURRENT_CREATIONS
+        )
+        JELLYFIN_POOL_SIZE = config["jellyfin"].get(
+            "pool_size", JELLYFIN_POOL_SIZE
+        )
+        JELLYFIN_POOL_REFILL_INTERVAL = config["jellyfin"].get(
+            "pool_refill_interval", JELLYFIN_POOL_REFILL_INTERVAL
+        )
+        JELLYFIN_RECONCILE_INTERVAL = config["jellyfin"].get(
+            "reconcile_interval", JELLYFIN_RECONCILE_INTERVAL
+        )
+        JELLYFIN_DELETE_ORPHANS = config["jellyfin"].get(
+            "delete_orphans", JELLYFIN_DELETE_ORPHANS
+        )
         JELLYFIN_ENABLED = True
 
+    if "http" in config:
+        HTTP_POOL_SIZE = config["http"].get("pool_size", HTTP_POOL_SIZE)
+        HTTP_TIMEOUT = config["http"].get("timeout", HTTP_TIMEOUT)
+        HTTP_CONNECT_TIMEOUT = config["http"].get(
+            "connect_timeout", HTTP_CONNECT_TIMEOUT
+        )
+        HTTP_KEEPALIVE_TIMEOUT = config["http"].get(
+            "keepalive_timeout", HTTP_KEEPALIVE_TIMEOUT
+        )
 
-def validate_profile(
-    service: str, url: str, headers: dict, config: dict
-) -> int:
-    """
-    Validate the quality profile ID for the given service
-
-    Args:
-        service (str): The service to validate the profile for
-        url (str): The URL of the service
-        headers (dict): The headers for the request
-        config (dict): The config file
+    if "status" in config:
+        QUEUE_REFRESH_INTERVAL = config["status"].get(
+            "queue_refresh_interval", QUEUE_REFRESH_INTERVAL
+        )
+        QUEUE_PAGE_SIZE = config["status"].get(
+            "queue_page_size", QUEUE_PAGE_SIZE
+        )
+        STATUS_RECONCILE_INTERVAL = config["status"].get(
+            "reconcile_interval", STATUS_RECONCILE_INTERVAL
+        )
+        STATUS_MAX_AGE = config["status"].get("max_age", STATUS_MAX_AGE)
+        STATUS_FULL_RECONCILE_INTERVAL = config["status"].get(
+            "full_reconcile_interval", STATUS_FULL_RECONCILE_INTERVAL
+        )
 
-    Returns:
-        int: The quality profile ID
-    """
-    profiles = requests.get(f"{url}/api/v3/qualityProfile", headers=headers)
+    if "lookup_cache" in config:
+        LOOKUP_CACHE_SIZE = config["lookup_cache"].get(
+            "size", LOOKUP_CACHE_SIZE
+        )
+        LOOKUP_CACHE_TTL = config["lookup_cache"].get("ttl", LOOKUP_CACHE_TTL)
 
-    if profiles.status_code != 200:
-        LOG.critical(
-            f"Error in config.yaml: Unable to get {service} quality profiles."
-            f" API Key invalid or incorrect {service} URL"
+    if "autocomplete" in config:
+        AUTOCOMPLETE_REFRESH_INTERVAL = config["autocomplete"].get(
+            "refresh_interval", AUTOCOMPLETE_REFRESH_INTERVAL
         )
 
-    else:
-        profiles = profiles.json()
-        # If ID is not given, list options
-        if "quality_profile_id" not in config[f"{service}"]:
-            LOG.critical(
-                "Error in config.yaml: No quality profile ID provided for"
-                f" {service}. Look below for a list of your available"
-                " profiles:"
-            )
+    if "webhook" in config:
+        WEBHOOK_HOST = config["webhook"].get("host", WEBHOOK_HOST)
+        WEBHOOK_PORT = config["webhook"].get("port", WEBHOOK_PORT)
+        WEBHOOK_PASSWORD = config["webhook"].get("password")
+        WEBHOOK_ENABLED = True
 
-            for profile in profiles:
-                LOG.info(f"ID: {profile['id']} | Name: {profile['name']}")
-
-        # ID is given, validate
-        else:
-            quality_profile_id = config[f"{service}"]["quality_profile_id"]
-            if quality_profile_id not in [
-                profile["id"] for profile in profiles
-            ]:
-                LOG.critical(
-                    f"Error in config.yaml: Invalid {service} quality profile"
-                    " ID. Look below for your available profiles:"
-                )
-
-                for profile in profiles:
-                    LOG.info(f"ID: {profile['id']} | Name: {profile['name']}")
-                sys.exit()
-            # Everything valid, assign
-            else:
-                return quality_profile_id
+    if "metrics" in config:
+        METRICS_HOST = config["metrics"].get("host", METRICS_HOST)
+        METRICS_PORT = config["metrics"].get("port", METRICS_PORT)
+        METRICS_ENABLED = True
+
+    if "service_check" in config:
+        SERVICE_CHECK_TIMEOUT = config["service_check"].get(
+            "timeout", SERVICE_CHECK_TIMEOUT
+        )
+        SERVICE_CHECK_INTERVAL = config["service_check"].get(
+            "interval", SERVICE_CHECK_INTERVAL
+        )
+
+    if "diagnostics" in config:
+        DIAGNOSTICS_SLOW_CALLBACK_DURATION = config["diagnostics"].get(
+            "slow_callback_duration", DIAGNOSTICS_SLOW_CALLBACK_DURATION
+        )
+        DIAGNOSTICS_ENABLED = True
+    # Diagnostics can also be turned on without editing the config
+    if os.environ.get("CORDARR_DIAGNOSTICS", "").lower() in ("1", "true"):
+        DIAGNOSTICS_ENABLED = True
+
+    if "sharding" in config:
+        # Discord recommends a shard count when none is given
+        SHARD_COUNT = config["sharding"].get("shard_count")
+        SHARD_IDS = config["sharding"].get("shard_ids")
+        LEADER_LEASE = config["sharding"].get("leader_lease", LEADER_LEASE)
+
+    if "database" in config:
+        DATABASE_URL = config["database"].get("url", DATABASE_URL)
+        DATABASE_POOL_SIZE = config["database"].get(
+            "pool_size", DATABASE_POOL_SIZE
+        )
+        DATABASE_MAX_OVERFLOW = config["database"].get(
+            "max_overflow", DATABASE_MAX_OVERFLOW
+        )
+        DATABASE_POOL_RECYCLE = config["database"].get(
+            "pool_recycle", DATABASE_POOL_RECYCLE
+        )
@@ -1,13 +1,18 @@
-import requests
+from utils.http_client import HTTPClient
+from utils.lookup_cache import LookupCache
+from utils.library_mirror import LibraryMirror
 
 
-def add_content(
+async def add_content(
     content_info: dict,
     service: str,
     host: str,
     headers: str,
     folder_path: str,
     profile_id: str,
+    http: HTTPClient,
+    cache: LookupCache,
+    library: LibraryMirror = None,
 ):
     """
     Add content to Sonarr or Radarr
@@ -19,22 +24,31 @@ def add_content(
         headers (str): The headers for the request
         folder_path (str): The folder path to download the content to
         profile_id (str): The profile ID to download the content in
+        http (HTTPClient): The shared HTTP client
+        cache (LookupCache): The shared lookup cache
+        library (LibraryMirror): The shared library mirror, or None
 
     Returns:
         str: The ID of the content or False
     """
-    # Get the content data based on ID
-    data = requests.get(
-        url=(
-            f"{host}/api/v3/movie/lookup/tmdb?tmdbId={content_info['contentId']}"
-            if service == "radarr"
-            else f"{host}/api/v3/series/lookup?term=tvdb:{content_info['contentId']}"
-        ),
-        headers=headers,
-    ).json()
+    # Get the content data based on ID, reusing the search payload if cached
+    data = cache.get_item(service, content_info["contentId"])
+    if data is None:
+        _, data = await http.get(
+            service,
+            (
+                f"{host}/api/v3/movie/lookup/tmdb?tmdbId={content_info['contentId']}"
+                if service == "radarr"
+                else f"{host}/api/v3/series/lookup?term=tvdb:{content_info['contentId']}"
+            ),
+            headers=headers,
+        )
+
+        if service == "sonarr":
+            data = data[0]
 
-    if service == "sonarr":
-        data = data[0]
+    # Copy so the cached payload isn't modified
+    data = dict(data)
 
     data["monitored"] = True
     data["qualityProfileId"] = profile_id
@@ -48,13 +62,18 @@ def add_content(
         ): True
     }
     # Send the request to add the content
-    response = requests.post(
+    status, response = await http.post(
+        service,
         f"{host}/api/v3/{'movie' if service == 'radarr' else 'series'}",
         headers=headers,
         json=data,
     )
 
-    if response.status_code == 201:
-        return response.json()["id"]
+    if status == 201:
+        # Cached lookups no longer reflect that the content is added
+        cache.invalidate(service, content_info["contentId"])
+        if library is not None:
+            library.add(service, content_info["contentId"], response["id"])
+        return response["id"]
     else:
         return False
@@ -0,0 +1,131 @@
+import asyncio
+
+from utils.models import Requests
+from utils.repository import add_requests
+from utils.http_client import HTTPClient
+from utils.lookup_cache import LookupCache
+from utils.library_mirror import LibraryMirror
+from utils.content_add import add_content
+from utils.content_get import (
+    get_content,
+    get_content_by_id,
+    parse_content_id,
+)
+
+
+async def bulk_add_content(
+    entries: list,
+    service: str,
+    host: str,
+    headers: str,
+    folder_path: str,
+    profile_id: int,
+    user_id: int,
+    http: HTTPClient,
+    cache: LookupCache,
+    workers: int,
+    library: LibraryMirror = None,
+) -> list:
+    """
+    Resolve and add many titles or TMDB/TVDB IDs to Sonarr or Radarr at once
+
+    Args:
+        entries (list): The titles or IDs (`tmdb:123` or `tvdb:123`)
+        service (str): The service to add the content to
+        host (str): The host URL
+        headers (str): The headers for the request
+        folder_path (str): The folder path to download the content to
+        profile_id (int): The profile ID to download the content in
+        user_id (int): The ID of the user requesting the content
+        http (HTTPClient): The shared HTTP client
+        cache (LookupCache): The shared lookup cache
+        workers (int): The maximum number of entries processed concurrently
+        library (LibraryMirror): The shared library mirror, or None
+
+    Returns:
+        list: A (label, status) tuple for every entry, in order
+    """
+    semaphore = asyncio.Semaphore(workers)
+
+    async def process(entry: str) -> tuple:
+        async with semaphore:
+            # Resolve the entry into the content it refers to
+            content_id = parse_content_id(entry, service)
+            if isinstance(content_id, str):
+                return entry, content_id, None, None
+            if content_id is not None:
+                content_info = await get_content_by_id(
+                    content_id,
+                    service,
+                    host,
+                    headers,
+                    http,
+                    cache,
+                    library,
+                )
+            else:
+                content_info = await get_content(
+                    entry, service, host, headers, http, cache, library
+                )
+                # Only the top result is added
+                if isinstance(content_info, list):
+                    content_info = content_info[0]
+                    if content_info["added"]:
+                        content_info = "ALREADY ADDED"
+
+            if isinstance(content_info, str):
+                return entry, content_info, None, None
+
+            local_id = await add_content(
+                content_info,
+                service,
+                host,
+                headers,
+                folder_path,
+                profile_id,
+                http,
+                cache,
+                library,
+            )
+            label = f"{content_info['title']} ({content_info['year']})"
+            if not local_id:
+                return label, "FAILED", None, None
+            return label, "ADDED", content_info, local_id
+
+    outcomes = await asyncio.gather(
+        *[process(entry) for entry in entries], return_exceptions=True
+    )
+
+    results = []
+    added = []
+    for entry, outcome in zip(entries, outcomes):
+        if isinstance(outcome, Exception):
+            results.append((entry, "FAILED"))
+            continue
+        label, status, content_info, local_id = outcome
+        results.append((label, status))
+        if content_info is not None:
+            added.append(
+                Requests(
+                    title=content_info["title"],
+                    release_year=content_info["year"],
+                    local_id=local_id,
+                    tmdbid=(
+                        content_info["contentId"]
+                        if service == "radarr"
+                        else None
+                    ),
+                    tvdbid=(
+                        None
+                        if service == "radarr"
+                        else content_info["contentId"]
+                    ),
+                    user_id=user_id,
+                )
+            )
+
+    # Keep track of all the requests in one transaction
+    if added:
+        await add_requests(added)
+
+    return results
@@ -1,11 +1,98 @@
-import requests
+import re
 
+from utils.http_client import HTTPClient
+from utils.lookup_cache import LookupCache
+from utils.library_mirror import LibraryMirror
 
-def get_content(
+ID_PATTERN = re.compile(r"^(tmdb|tvdb):\s*(\d+)$", re.IGNORECASE)
+
+# Value of `added` in lookup results for content that isn't in the library
+NOT_ADDED = "0001-01-01T05:51:00Z"
+
+
+def parse_content_id(entry: str, service: str):
+    """
+    Parse a `tmdb:123` (radarr) or `tvdb:123` (sonarr) ID
+
+    Args:
+        entry (str): The entry given by the user
+        service (str): The service the content is requested from
+
+    Returns:
+        int: The ID, None if the entry isn't an ID
+        str: WRONG ID TYPE, if the ID is for the other service
+    """
+    match = ID_PATTERN.match(entry.strip())
+    if not match:
+        return None
+    if match.group(1).lower() != ("tmdb" if service == "radarr" else "tvdb"):
+        return "WRONG ID TYPE"
+    return int(match.group(2))
+
+
+def is_added(service: str, data: dict, library: LibraryMirror) -> bool:
+    """
+    Check whether content from a lookup is already in the library, through
+    the library mirror once it is synced
+
+    Args:
+        service (str): The service the content belongs to
+        data (dict): The lookup result of the content
+        library (LibraryMirror): The shared library mirror, or None
+
+    Returns:
+        bool: Whether or not the content is already added
+    """
+    if library is not None and library.is_synced(service):
+        content_id = LibraryMirror.external_id(service, data)
+        return library.get(service, content_id) is not None
+    return data["added"] != NOT_ADDED
+
+
+def build_content_info(
+    service: str, data: dict, library: LibraryMirror
+) -> dict:
+    """
+    Build the content_info dict shown to the user from a lookup result
+
+    Args:
+        service (str): The service the content belongs to
+        data (dict): The lookup result of the content
+        library (LibraryMirror): The shared library mirror, or None
+
+    Returns:
+        dict: The content_info dict
+    """
+    content_info = {
+        "title": data["title"],
+        "year": data["year"],
+        "contentId": LibraryMirror.external_id(service, data),
+        "added": is_added(service, data, library),
+    }
+
+    # Add overview field, set None if not available
+    try:
+        content_info["description"] = data["overview"]
+    except KeyError:
+        content_info["description"] = "No description available"
+
+    # Add remotePoster field, set None if not available
+    try:
+        content_info["remotePoster"] = data["images"][0]["remoteUrl"]
+    except (KeyError, IndexError):
+        content_info["remotePoster"] = None
+
+    return content_info
+
+
+async def get_content(
     query: str,
     service: str,
     host: str,
     headers: str,
+    http: HTTPClient,
+    cache: LookupCache,
+    library: LibraryMirror = None,
 ):
     """
     Fetch the top 5 results from the service given a query
@@ -15,50 +102,101 @@ def get_content(
         service (str): The service to search in
         host (str): The host URL
         headers (str): The headers for the request
+        http (HTTPClient): The shared HTTP client
+        cache (LookupCache): The shared lookup cache
+        library (LibraryMirror): The shared library mirror, flags the
+            results already added
 
     Returns:
         list: A list containing content_info dict
         str: NO RESULTS
         str: ALREADY ADDED
+        str: LOOKUP FAILED
     """
-    query = query.strip().replace(" ", "%20")
-    # Search for matching content
-    results = requests.get(
-        f"{host}/api/v3/{'movie' if service == 'radarr' else 'series'}/lookup?term={query}",
-        headers=headers,
-    ).json()
+    # Search for matching content, unless recently searched
+    results = cache.get_search(service, query)
+    if results is None:
+        status, results = await http.get(
+            service,
+            f"{host}/api/v3/{'movie' if service == 'radarr' else 'series'}/lookup",
+            params={"term": query.strip()},
+            headers=headers,
+        )
+        # e.g. an error body, or the metadata provider being unreachable
+        if status != 200 or not isinstance(results, list):
+            return "LOOKUP FAILED"
+        cache.put_search(service, query, results)
 
     if len(results) == 0:
         return "NO RESULTS"
-    # If already added to library
-    if results[0]["added"] != "0001-01-01T05:51:00Z":
-        return "ALREADY ADDED"
 
     # Add info for top results
     content_info = []
-    for i in range(min(5, len(results))):
-        content_info.append(
-            {
-                "title": results[i]["title"],
-                "year": results[i]["year"],
-                "contentId": results[i][
-                    f"{'tmdbId' if service == 'radarr' else 'tvdbId'}"
-                ],
-            }
+    for result in results[:5]:
+        content_info.append(build_content_info(service, result, library))
+        # Keep the full payload so it can be reused when adding the content
+        cache.put_item(service, content_info[-1]["contentId"], result)
+
+    # If every result is already added to library
+    if all(content["added"] for content in content_info):
+        return "ALREADY ADDED"
+
+    return content_info
+
+
+async def get_content_by_id(
+    content_id: int,
+    service: str,
+    host: str,
+    headers: str,
+    http: HTTPClient,
+    cache: LookupCache,
+    library: LibraryMirror = None,
+):
+    """
+    Fetch a single piece of content from the service given its TMDB/TVDB ID
+
+    Args:
+        content_id (int): The TMDB (radarr) or TVDB (sonarr) ID
+        service (str): The service to search in
+        host (str): The host URL
+        headers (str): The headers for the request
+        http (HTTPClient): The shared HTTP client
+        cache (LookupCache): The shared lookup cache
+        library (LibraryMirror): The shared library mirror, skips the lookup
+            of content already added
+
+    Returns:
+        dict: The content_info dict
+        str: NO RESULTS
+        str: ALREADY ADDED
+    """
+    if (
+        library is not None
+        and library.is_synced(service)
+        and library.get(service, content_id) is not None
+    ):
+        return "ALREADY ADDED"
+
+    data = cache.get_item(service, content_id)
+    if data is None:
+        status, data = await http.get(
+            service,
+            (
+                f"{host}/api/v3/movie/lookup/tmdb?tmdbId={content_id}"
+                if service == "radarr"
+                else f"{host}/api/v3/series/lookup?term=tvdb:{content_id}"
+            ),
+            headers=headers,
         )
+        if status != 200 or not data:
+            return "NO RESULTS"
+        if service == "sonarr":
+            data = data[0]
+        cache.put_item(service, content_id, data)
 
-        # Add overview field, set None if not available
-        try:
-            content_info[i]["description"] = results[i]["overview"]
-        except KeyError:
-            content_info[i]["description"] = "No description available"
-
-        # Add remotePoster field, set None if not available
-        try:
-            content_info[i]["remotePoster"] = results[i]["images"][0][
-                "remoteUrl"
-            ]
-        except IndexError:
-            content_info[i]["remotePoster"] = None
+    content_info = build_content_info(service, data, library)
+    if content_info["added"]:
+        return "ALREADY ADDED"
 
     return content_info
@@ -1,7 +1,7 @@
 import discord
 
 from utils.models import Requests
-from utils.database import Session
+from utils.repository import add_requests
 from utils.content_add import add_content
 
 """
@@ -60,7 +60,14 @@ class AddContentDropdown(discord.ui.Select):
                     label=(
                         f"{content_data[i]['title']} ({content_data[i]['year']})"
                     ),
-                    description=f"Relevant ID: {content_data[i]['contentId']}",
+                    description=(
+                        f"Relevant ID: {content_data[i]['contentId']}"
+                        + (
+                            " | Already added"
+                            if content_data[i].get("added")
+                            else ""
+                        )
+                    ),
                     value=str(i),
                 )
             )
@@ -75,6 +82,20 @@ class AddContentDropdown(discord.ui.Select):
         # Index of selected option
         index = int(self.values[0])
 
+        # Content already in the library can't be requested again, leave
+        # the dropdown so another result can be picked
+        if self.content_data[index].get("added"):
+            embed = discord.Embed(
+                title="Already Added",
+                description=(
+                    f"**{self.content_data[index]['title']}** is already"
+                    f" added to the {self.service} library. Check the status"
+                    " of the content you have requested with `/status`."
+                ),
+                color=0xD01B86,
+            )
+            return await interaction.response.edit_message(embed=embed)
+
         # Add selected contents info to an embed
         embed = discord.Embed(
             title="Is the the content you want to add?",
@@ -128,13 +149,16 @@ class RequestButtonView(discord.ui.View):
         self, interaction: discord.Interaction, button: discord.ui.Button
     ):
         # Add the content to the relevant library
-        local_id = add_content(
+        local_id = await add_content(
             self.content_info,
             self.service,
             self.host,
             self.headers,
             self.path,
             self.profile,
+            interaction.client.http_client,
+            interaction.client.lookup_cache,
+            interaction.client.library,
         )
 
         # Alert the user that the content has been added
@@ -164,8 +188,8 @@ class RequestButtonView(discord.ui.View):
             return await interaction.response.edit_message(embed=embed)
 
         # Keep track of the requests for the `/status` command
-        with Session() as session:
-            session.add(
+        await add_requests(
+            [
                 Requests(
                     title=self.content_info["title"],
                     release_year=self.content_info["year"],
@@ -182,8 +206,8 @@ class RequestButtonView(discord.ui.View):
                     ),
                     user_id=interaction.user.id,
                 )
-            )
-            session.commit()
+            ]
+        )
 
     @discord.ui.button(label="Don't Request", style=discord.ButtonStyle.danger)
     async def dont_request_button(
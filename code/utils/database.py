@@ -1,13 +1,113 @@
-from sqlalchemy import create_engine
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 import os
 
-if not os.path.exists("data"):
-    os.makedirs("data")
+import utils.config as config
+from utils.metrics import instrument_engine
 
-database_url = "sqlite:///data/cordarr.db"
-
-engine = create_engine(database_url)
-Session = sessionmaker(bind=engine)
+# Created by `init_database` once the config has been loaded
+engine = None
+Session = async_sessionmaker(expire_on_commit=False)
 Base = declarative_base()
+
+
+def create_engine_from_config():
+    """
+    Create the database engine from the URL and pool settings in the config
+
+    Returns:
+        AsyncEngine: The database engine
+    """
+    if config.DATABASE_URL.startswith("sqlite"):
+        if not os.path.exists("data"):
+            os.makedirs("data")
+
+        sqlite_engine = create_async_engine(config.DATABASE_URL)
+        event.listen(sqlite_engine.sync_engine, "connect", configure_sqlite)
+        return sqlite_engine
+
+    # Shared databases (e.g. PostgreSQL) are used through a connection pool
+    return create_async_engine(
+        config.DATABASE_URL,
+        pool_size=config.DATABASE_POOL_SIZE,
+        max_overflow=config.DATABASE_MAX_OVERFLOW,
+        pool_recycle=config.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+def configure_sqlite(dbapi_connection, connection_record) -> None:
+    """
+    Let reads run alongside writes and wait for locks instead of failing
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+async def init_database() -> None:
+    """
+    Connect to the database and create any missing tables, then add the
+    columns and indexes that were introduced after a table was first created
+    """
+    global engine
+
+    engine = create_engine_from_config()
+    instrument_engine(engine)
+    Session.configure(bind=engine)
+
+    # Register the models before creating/upgrading their tables
+    import utils.models
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.run_sync(add_missing_columns)
+
+    # Indexes are created one by one, so that a unique index failing on
+    # existing duplicate rows doesn't prevent the others from being created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                async with engine.begin() as connection:
+                    await connection.run_sync(index.create, checkfirst=True)
+            except IntegrityError:
+                config.LOG.warning(
+                    f"Unable to create index {index.name}, remove the"
+                    f" duplicate rows from {table.name} to create it"
+                )
+
+
+def add_missing_columns(connection) -> None:
+    """
+    Add any columns missing from existing tables, since `create_all` only
+    creates missing tables
+
+    Args:
+        connection (Connection): The synchronous connection to migrate with
+    """
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        existing = {
+            column["name"] for column in inspector.get_columns(table.name)
+        }
+        for column in table.columns:
+            if column.name not in existing:
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {table.name} ADD COLUMN"
+                        f" {column.name}"
+                        f" {column.type.compile(connection.dialect)}"
+                    )
+                )
+
+
+async def close_database() -> None:
+    """
+    Close every pooled database connection
+    """
+    if engine is not None:
+        await engine.dispose()
@@ -0,0 +1,164 @@
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import traceback
+
+"""
+Opt-in diagnostics finding what blocks the event loop: asyncio's slow
+callback reporting, plus a watchdog thread that samples the loop's stack
+while it is blocked to attribute each stall to a command and call site
+"""
+
+# Directory containing the bot's own code (cogs/ and utils/)
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def describe_stack(frame) -> tuple:
+    """
+    Attribute a stack to the command running it and the bot code at its top
+
+    Args:
+        frame (frame): The innermost frame of the stack
+
+    Returns:
+        tuple: The command (cog.function, or "background") and the call site
+    """
+    command = None
+    call_site = None
+    stack = traceback.extract_stack(frame)
+    for summary in stack:
+        if not summary.filename.startswith(CODE_DIR + os.sep):
+            continue
+        path = os.path.relpath(summary.filename, CODE_DIR)
+        # The outermost frame within a cog is the command being run
+        if command is None and path.startswith("cogs" + os.sep):
+            command = f"{os.path.basename(path)[:-3]}.{summary.name}"
+        call_site = f"{path}:{summary.lineno} ({summary.name})"
+
+    # Stacks that never went through the bot's code (e.g. in discord.py)
+    if call_site is None:
+        innermost = stack[-1]
+        call_site = (
+            f"{os.path.basename(innermost.filename)}:{innermost.lineno}"
+            f" ({innermost.name})"
+        )
+    return command or "background", call_site
+
+
+class StallMonitor:
+    """
+    Detect and attribute the periods where the event loop is blocked
+
+    A heartbeat task updates a timestamp on the loop, and a watchdog thread
+    samples the loop thread's stack whenever the heartbeat falls behind by
+    more than the threshold
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.interval = threshold / 2
+        # (command, call site) -> [stalls, seconds blocked]
+        self.offenders = collections.defaultdict(lambda: [0, 0.0])
+        self._lock = threading.Lock()
+        self._heartbeat = time.monotonic()
+        self._heartbeat_task = None
+        self._loop_thread_id = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """
+        Start monitoring the running event loop
+        """
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.threshold
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat_task = asyncio.create_task(self.beat())
+        threading.Thread(
+            target=self.watch, name="stall-watchdog", daemon=True
+        ).start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+
+    async def beat(self) -> None:
+        while True:
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def watch(self) -> None:
+        """
+        Sample the loop thread's stack while the heartbeat is late
+        """
+        stalled = False
+        while not self._stopped.wait(self.interval):
+            late = time.monotonic() - self._heartbeat - self.interval
+            if late < self.threshold:
+                stalled = False
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            key = describe_stack(frame)
+            with self._lock:
+                offender = self.offenders[key]
+                # Count the stall once, but every sample adds to its time
+                if not stalled:
+                    offender[0] += 1
+                    offender[1] += late
+                else:
+                    offender[1] += self.interval
+            stalled = True
+
+    def top_offenders(self, limit: int = 10) -> list:
+        """
+        Get the commands and call sites that blocked the loop the longest
+
+        Args:
+            limit (int): The number of offenders to return
+
+        Returns:
+            list: (command, call site, stalls, seconds) tuples
+        """
+        with self._lock:
+            offenders = [
+                (command, call_site, stalls, seconds)
+                for (command, call_site), (
+                    stalls,
+                    seconds,
+                ) in self.offenders.items()
+            ]
+        return sorted(offenders, key=lambda offender: -offender[3])[:limit]
+
+    def profile(self, seconds: float, interval: float = 0.005) -> list:
+        """
+        Sample the loop thread's stack for a while, blocking the calling
+        thread (run it through `asyncio.to_thread`)
+
+        Args:
+            seconds (float): How long to sample for
+            interval (float): The time between samples
+
+        Returns:
+            list: (command, call site, share of samples) tuples, most
+                sampled first
+        """
+        samples = collections.Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                samples[describe_stack(frame)] += 1
+            time.sleep(interval)
+
+        total = sum(samples.values()) or 1
+        return [
+            (command, call_site, count / total)
+            for (command, call_site), count in samples.most_common()
+        ]
@@ -0,0 +1,143 @@
+import aiohttp
+import asyncio
+import time
+
+from utils.metrics import observe_upstream
+
+
+class HTTPClient:
+    """
+    Bot-wide async HTTP client used for every Radarr/Sonarr/Jellyfin call
+
+    A separate keep-alive connection pool is kept for each upstream service
+    so that a slow service can never exhaust the connections of another
+    """
+
+    def __init__(
+        self,
+        pool_size: int,
+        timeout: float,
+        connect_timeout: float,
+        keepalive_timeout: float,
+    ):
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout, connect=connect_timeout
+        )
+        self.keepalive_timeout = keepalive_timeout
+        self._sessions = {}
+        # Replaced sessions waiting for their requests to finish
+        self._retiring = {}
+
+    def configure(
+        self,
+        pool_size: int,
+        timeout: float,
+        connect_timeout: float,
+        keepalive_timeout: float,
+    ) -> None:
+        """
+        Apply new pool settings, replacing the session of every service
+        """
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout, connect=connect_timeout
+        )
+        self.keepalive_timeout = keepalive_timeout
+        for service in list(self._sessions):
+            self.reset(service)
+
+    def reset(self, service: str) -> None:
+        """
+        Replace the session of a service, used when its host changes. New
+        requests get a new connection pool straight away, while the old
+        session is closed once its requests have had time to finish
+
+        Args:
+            service (str): The upstream service (radarr, sonarr, jellyfin)
+        """
+        session = self._sessions.pop(service, None)
+        if session is None:
+            return
+        task = asyncio.create_task(self._retire(session))
+        self._retiring[task] = session
+        task.add_done_callback(lambda task: self._retiring.pop(task, None))
+
+    async def _retire(self, session: aiohttp.ClientSession) -> None:
+        await asyncio.sleep(self.timeout.total)
+        await session.close()
+
+    def session(self, service: str) -> aiohttp.ClientSession:
+        """
+        Get the pooled session for a service, creating it if necessary
+
+        Args:
+            service (str): The upstream service (radarr, sonarr, jellyfin)
+
+        Returns:
+            aiohttp.ClientSession: The session for the service
+        """
+        session = self._sessions.get(service)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout
+            )
+            self._sessions[service] = session
+        return session
+
+    async def request(
+        self, service: str, method: str, url: str, **kwargs
+    ) -> tuple:
+        """
+        Send a request through the pool of the given service
+
+        Args:
+            service (str): The upstream service (radarr, sonarr, jellyfin)
+            method (str): The HTTP method
+            url (str): The full URL of the request
+            **kwargs: Extra arguments passed on to aiohttp (headers, json...)
+
+        Returns:
+            tuple: The status code and the decoded JSON body (or None)
+        """
+        started = time.perf_counter()
+        status = None
+        try:
+            async with self.session(service).request(
+                method, url, **kwargs
+            ) as response:
+                status = response.status
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    data = None
+                return response.status, data
+        finally:
+            observe_upstream(service, method, status, started)
+
+    async def get(self, service: str, url: str, **kwargs) -> tuple:
+        return await self.request(service, "GET", url, **kwargs)
+
+    async def post(self, service: str, url: str, **kwargs) -> tuple:
+        return await self.request(service, "POST", url, **kwargs)
+
+    async def delete(self, service: str, url: str, **kwargs) -> tuple:
+        return await self.request(service, "DELETE", url, **kwargs)
+
+    async def close(self) -> None:
+        """
+        Close every pooled session
+        """
+        # Close the replaced sessions without waiting any longer
+        for task, session in list(self._retiring.items()):
+            task.cancel()
+            await session.close()
+        self._retiring.clear()
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
@@ -1,81 +1,144 @@
+import asyncio
 import datetime
-import requests
+import functools
 import random
 from wonderwords import RandomWord
 from string import ascii_lowercase, digits
 
-from utils.database import Session
-from utils.models import JellyfinAccounts
-from utils.config import (
-    JELLYFIN_URL,
-    JELLYFIN_HEADERS,
-    ACCOUNT_TIME,
-    SIMPLE_PASSWORDS,
-)
+from utils.repository import add_account
+from utils.http_client import HTTPClient
+from utils.jellyfin_delete import delete_jellyfin_user
+import utils.config as config
 
+# Limit how many accounts are being created in Jellyfin at the same time
+creation_limit = asyncio.Semaphore(config.JELLYFIN_MAX_CONCURRENT_CREATIONS)
 
-def create_jellyfin_account(user_id):
+
+@functools.cache
+def word_pool(min_length: int, max_length: int) -> tuple:
     """
-    Create a new Jellyfin account for the user and return the username and password
+    Load the words of the given lengths once and keep them in memory
 
     Args:
-        user_id (int): Discord user ID to create the account for
+        min_length (int): The minimum length of the words
+        max_length (int): The maximum length of the words
 
     Returns:
-        tuple: The username and password of the new Jellyfin account
+        tuple: The words
+    """
+    return tuple(
+        RandomWord().filter(
+            word_min_length=min_length,
+            word_max_length=max_length,
+            exclude_with_spaces=True,
+        )
+    )
+
+
+def generate_credentials() -> tuple:
+    """
+    Generate a random username and password
+
+    Returns:
+        tuple: The username and password
     """
-    # Create username/password
-    username = RandomWord().word(word_min_length=5, word_max_length=5)
-    if SIMPLE_PASSWORDS:
-        password = RandomWord().word(word_min_length=5, word_max_length=10)
+    username = random.choice(word_pool(5, 5))
+    if config.SIMPLE_PASSWORDS:
+        password = random.choice(word_pool(5, 10))
     else:
         password = "".join(random.choices(ascii_lowercase + digits, k=15))
+    return username, password
 
-    deletion_time = datetime.datetime.now() + datetime.timedelta(
-        minutes=ACCOUNT_TIME * 60
-    )
-    # Create the new Jellyfin account
-    request_1 = requests.post(
-        f"{JELLYFIN_URL}/Users/New",
-        headers=JELLYFIN_HEADERS,
-        json={"Name": username, "Password": password},
-    )
 
-    if request_1.status_code != 200:
-        return False
+async def create_jellyfin_user(
+    http: HTTPClient,
+    username: str,
+    password: str,
+    user_id: int = None,
+    deletion_time: datetime.datetime = None,
+    disabled: bool = False,
+) -> dict:
+    """
+    Create a Jellyfin user with the guest account policy and store it
 
-    # Get the user ID of the new account
-    jellyfin_user_id = request_1.json()["Id"]
-    # Get the account policy and make edits
-    request_2 = requests.get(
-        f"{JELLYFIN_URL}/Users/{jellyfin_user_id}", headers=JELLYFIN_HEADERS
-    )
-    if request_2.status_code != 200:
-        return False
+    Args:
+        http (HTTPClient): The shared HTTP client
+        username (str): The username of the new user
+        password (str): The password of the new user
+        user_id (int): Discord user ID owning the account, None for pooled
+            accounts
+        deletion_time (datetime.datetime): When the account expires
+        disabled (bool): Whether the user should be created disabled
 
-    account_policy = request_2.json()
-    account_policy["Policy"]["SyncPlayAccess"] = "JoinGroups"
-    account_policy["Policy"]["EnableContentDownloading"] = False
-    account_policy["Policy"]["InvalidLoginAttemptCount"] = 3
-    account_policy["Policy"]["MaxActiveSessions"] = 1
-    # Update the user with the newly edited policy
-    request_3 = requests.post(
-        f"{JELLYFIN_URL}/Users?userId={jellyfin_user_id}",
-        headers=JELLYFIN_HEADERS,
-        json=account_policy,
-    )
-    if request_3.status_code != 204:
-        return False
+    Returns:
+        dict: The policy applied to the user, or None if it couldn't be
+            created
+    """
+    async with creation_limit:
+        # Create the new Jellyfin account
+        status, new_user = await http.post(
+            "jellyfin",
+            f"{config.JELLYFIN_URL}/Users/New",
+            headers=config.JELLYFIN_HEADERS,
+            json={"Name": username, "Password": password},
+        )
+
+        if status != 200:
+            return None
 
-    # Add the information to the database
-    with Session() as session:
-        session.add(
-            JellyfinAccounts(
-                user_id=user_id,
-                jellyfin_user_id=jellyfin_user_id,
-                deletion_time=deletion_time,
+        # Get the user ID of the new account
+        jellyfin_user_id = new_user["Id"]
+        try:
+            # Edit the policy returned with the new user and update it
+            account_policy = new_user["Policy"]
+            account_policy["SyncPlayAccess"] = "JoinGroups"
+            account_policy["EnableContentDownloading"] = False
+            account_policy["InvalidLoginAttemptCount"] = 3
+            account_policy["MaxActiveSessions"] = 1
+            account_policy["IsDisabled"] = disabled
+            status, _ = await http.post(
+                "jellyfin",
+                f"{config.JELLYFIN_URL}/Users/{jellyfin_user_id}/Policy",
+                headers=config.JELLYFIN_HEADERS,
+                json=account_policy,
             )
-        )
-        session.commit()
+            if status != 204:
+                raise Exception(f"Jellyfin returned {status}")
+
+            # Add the information to the database
+            await add_account(
+                user_id, jellyfin_user_id, deletion_time, username
+            )
+        except Exception as e:
+            # Don't leave a half set up account behind
+            config.LOG.error(
+                f"Failed setting up Jellyfin account {username}: {e}"
+            )
+            await delete_jellyfin_user(http, jellyfin_user_id)
+            return None
+
+    return account_policy
+
+
+async def create_jellyfin_account(user_id, http: HTTPClient):
+    """
+    Create a new Jellyfin account for the user and return the username and password
+
+    Args:
+        user_id (int): Discord user ID to create the account for
+        http (HTTPClient): The shared HTTP client
+
+    Returns:
+        tuple: The username and password of the new Jellyfin account
+    """
+    username, password = generate_credentials()
+    deletion_time = datetime.datetime.now() + datetime.timedelta(
+        minutes=config.ACCOUNT_TIME * 60
+    )
+    policy = await create_jellyfin_user(
+        http, username, password, user_id, deletion_time
+    )
+    if policy is None:
+        return False
 
     return username, password
@@ -1,46 +1,249 @@
+import asyncio
 import datetime
-import requests
+import aiohttp
 
-from utils.database import Session
-from utils.models import JellyfinAccounts
-from utils.config import LOG, JELLYFIN_URL, JELLYFIN_HEADERS
+from utils.repository import (
+    get_accounts,
+    get_next_deletion_time,
+    remove_accounts,
+)
+from utils.http_client import HTTPClient
+import utils.config as config
 
+# Delay before retrying accounts that failed to be deleted
+RETRY_DELAY = 60
+# Attempts made to delete a user during a single run, and the delay before
+# the first retry (doubled after each attempt)
+DELETE_ATTEMPTS = 3
+DELETE_BACKOFF = 1
 
-def delete_accounts():
+
+def is_guest_account(user: dict) -> bool:
+    """
+    Check whether a Jellyfin user has the policy given to the accounts
+    created by the bot (see `create_jellyfin_user`)
+
+    Args:
+        user (dict): The Jellyfin user
+
+    Returns:
+        bool: Whether or not the user looks like a bot created account
+    """
+    policy = user.get("Policy", {})
+    return (
+        not policy.get("IsAdministrator")
+        and policy.get("MaxActiveSessions") == 1
+        and policy.get("SyncPlayAccess") == "JoinGroups"
+        and policy.get("EnableContentDownloading") is False
+    )
+
+
+async def delete_jellyfin_user(
+    http: HTTPClient, jellyfin_user_id: str, attempts: int = 1
+) -> bool:
+    """
+    Delete a single user from Jellyfin, backing off between attempts
+
+    Args:
+        http (HTTPClient): The shared HTTP client
+        jellyfin_user_id (str): The ID of the Jellyfin user
+        attempts (int): How many times to try before giving up
+
+    Returns:
+        bool: Whether or not the user was deleted
+    """
+    config.LOG.info(f"Deleting account {jellyfin_user_id}")
+    for attempt in range(attempts):
+        if attempt:
+            await asyncio.sleep(DELETE_BACKOFF * 2 ** (attempt - 1))
+        try:
+            status, _ = await http.delete(
+                "jellyfin",
+                f"{config.JELLYFIN_URL}/Users/{jellyfin_user_id}",
+                headers=config.JELLYFIN_HEADERS,
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            continue
+        # Users that no longer exist don't need deleting
+        if status < 400 or status == 404:
+            return True
+
+    config.LOG.error(
+        f"Failed deleting Jellyfin account w/ ID {jellyfin_user_id}"
+    )
+    return False
+
+
+class ExpiryScheduler:
     """
-    Delete Jellyfin accounts that have passed their deletion time
+    Delete expired Jellyfin accounts, sleeping until the earliest deletion
+    time instead of polling the database. Every run also reconciles the
+    stored accounts with the users that actually exist in Jellyfin
     """
-    # Get all expired Jellyfin accounts
-    with Session() as session:
-        jellyfin_user_ids = (
-            session.query(JellyfinAccounts.jellyfin_user_id)
-            .filter(JellyfinAccounts.deletion_time < datetime.datetime.now())
-            .all()
+
+    def __init__(
+        self, http: HTTPClient, poll_interval: float = None, services=None
+    ):
+        """
+        Args:
+            http (HTTPClient): The shared HTTP client
+            poll_interval (float): Longest time to sleep without checking
+                the next deletion time, needed when other processes (that
+                can't wake this one up) create accounts
+            services (ServiceMonitor): Skips the runs while Jellyfin is down,
+                None to always run
+        """
+        self.http = http
+        self.poll_interval = poll_interval
+        self.services = services
+        self._wakeup = asyncio.Event()
+        self._task = None
+        # Untracked guest users seen on the previous run
+        self._orphan_suspects = set()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+
+    def wake(self) -> None:
+        """
+        Re-check the next deletion time, used when a new account is created
+        """
+        self._wakeup.set()
+
+    async def reconcile(self) -> None:
+        """
+        Diff the stored accounts against the Jellyfin users, deleting expired
+        (and optionally orphaned) users and forgetting accounts that were
+        removed from Jellyfin by hand
+        """
+        # Read the accounts before the users, so that an account created in
+        # between can't be mistaken for one removed from Jellyfin
+        accounts = await get_accounts()
+        status, users = await self.http.get(
+            "jellyfin",
+            f"{config.JELLYFIN_URL}/Users",
+            headers=config.JELLYFIN_HEADERS,
         )
+        if status != 200:
+            raise Exception(f"Jellyfin returned {status} listing users")
+
+        now = datetime.datetime.now()
+        jellyfin_ids = {user["Id"] for user in users}
+        known_ids = {jellyfin_user_id for jellyfin_user_id, _ in accounts}
+        expired_ids = {
+            jellyfin_user_id
+            for jellyfin_user_id, deletion_time in accounts
+            if deletion_time is not None and deletion_time < now
+        } & jellyfin_ids
+        missing_ids = known_ids - jellyfin_ids
 
-        # Delete each account
-        for jellyfin_user_id in jellyfin_user_ids:
-            print(f"Deleting account {jellyfin_user_id[0]}")
-            try:
-                response = requests.delete(
-                    f"{JELLYFIN_URL}/Users/{jellyfin_user_id[0]}",
-                    headers=JELLYFIN_HEADERS,
+        orphaned_ids = set()
+        if config.JELLYFIN_DELETE_ORPHANS:
+            suspects = {
+                user["Id"] for user in users if is_guest_account(user)
+            } - known_ids
+            # An account being created exists in Jellyfin just before it is
+            # stored, so only delete users left untracked for two runs
+            orphaned_ids = suspects & self._orphan_suspects
+            self._orphan_suspects = suspects - orphaned_ids
+
+        # Delete the users from Jellyfin concurrently
+        to_delete = list(expired_ids | orphaned_ids)
+        results = await asyncio.gather(
+            *[
+                delete_jellyfin_user(
+                    self.http, jellyfin_user_id, DELETE_ATTEMPTS
                 )
-                response.raise_for_status()
-                # Get the account and delete it
-                account = (
-                    session.query(JellyfinAccounts)
-                    .filter(
-                        JellyfinAccounts.jellyfin_user_id
-                        == jellyfin_user_id[0]
+                for jellyfin_user_id in to_delete
+            ]
+        )
+        deleted_ids = {
+            jellyfin_user_id
+            for jellyfin_user_id, deleted in zip(to_delete, results)
+            if deleted
+        }
+
+        # Forget every deleted or missing account in one transaction
+        stale_ids = (deleted_ids | missing_ids) & known_ids
+        if stale_ids:
+            await remove_accounts(list(stale_ids))
+
+        if to_delete or missing_ids:
+            config.LOG.info(
+                "Reconciled Jellyfin accounts:"
+                f" {len(deleted_ids & expired_ids)} expired deleted,"
+                f" {len(deleted_ids & orphaned_ids)} orphaned deleted,"
+                f" {len(missing_ids)} missing forgotten,"
+                f" {len(to_delete) - len(deleted_ids)} failed"
+            )
+
+    async def time_until_due(
+        self, reconciled: datetime.datetime, failed: bool
+    ) -> float:
+        """
+        Get the time left until the next run, which is due once the next
+        account expires or the reconcile interval has passed
+
+        Args:
+            reconciled (datetime.datetime): When the last run started
+            failed (bool): Whether or not the last run failed
+
+        Returns:
+            float: The number of seconds until the next run
+        """
+        retry = reconciled + datetime.timedelta(seconds=RETRY_DELAY)
+        if failed:
+            due = retry
+        else:
+            due = reconciled + datetime.timedelta(
+                seconds=config.JELLYFIN_RECONCILE_INTERVAL
+            )
+        try:
+            deadline = await get_next_deletion_time()
+        except Exception as e:
+            config.LOG.error(f"Failed getting the next deletion time: {e}")
+            deadline = retry
+        if deadline is not None:
+            # Accounts that expired before the last run failed to be deleted
+            if deadline <= reconciled:
+                deadline = retry
+            due = min(due, deadline)
+        return (due - datetime.datetime.now()).total_seconds()
+
+    async def run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            reconciled = datetime.datetime.now()
+            failed = False
+            # The service monitor already reports Jellyfin being down, so
+            # quietly retry once it may be back
+            if self.services is not None and not self.services.is_available(
+                "jellyfin"
+            ):
+                failed = True
+            else:
+                try:
+                    await self.reconcile()
+                except Exception as e:
+                    config.LOG.error(
+                        f"Failed reconciling Jellyfin accounts: {e}"
                     )
-                    .first()
-                )
-                session.delete(account)
-            except:
-                LOG.error(
-                    "Failed deleting Jellyfin account w/ ID"
-                    f" {jellyfin_user_id[0]}"
-                )
-        # Commit changes
-        session.commit()
+                    failed = True
+
+            # Sleep until the next run is due, checking the next deletion
+            # time again whenever woken up
+            while True:
+                timeout = await self.time_until_due(reconciled, failed)
+                if timeout <= 0:
+                    break
+                if self.poll_interval is not None:
+                    timeout = min(timeout, self.poll_interval)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
@@ -0,0 +1,140 @@
+import asyncio
+import datetime
+import random
+from string import ascii_lowercase, digits
+
+from utils.repository import (
+    claim_pool_account,
+    count_pool_accounts,
+    remove_accounts,
+)
+from utils.http_client import HTTPClient
+from utils.jellyfin_create import create_jellyfin_user, generate_credentials
+from utils.jellyfin_delete import delete_jellyfin_user
+import utils.config as config
+
+
+class AccountPool:
+    """
+    Keep a number of disabled Jellyfin accounts created ahead of time, so
+    handing one out only takes enabling it and setting its password
+    """
+
+    def __init__(self, http: HTTPClient, size: int):
+        self.http = http
+        self.size = size
+        # Policy shared by every pooled account, learnt when creating or
+        # claiming one
+        self.policy = None
+        self._refilling = asyncio.Lock()
+
+    async def refill(self) -> None:
+        """
+        Create accounts until the pool is back to its full size
+        """
+        if self._refilling.locked():
+            return
+
+        async with self._refilling:
+            missing = self.size - await count_pool_accounts()
+            if missing <= 0:
+                return
+
+            results = await asyncio.gather(
+                *[self.create_account() for _ in range(missing)]
+            )
+            config.LOG.info(
+                f"Added {sum(results)}/{missing} accounts to the Jellyfin pool"
+            )
+
+    async def create_account(self) -> bool:
+        """
+        Create a single disabled account and add it to the pool
+
+        Returns:
+            bool: Whether or not the account was created
+        """
+        username, _ = generate_credentials()
+        # The real password is set when the account is claimed
+        placeholder = "".join(random.choices(ascii_lowercase + digits, k=32))
+        policy = await create_jellyfin_user(
+            self.http, username, placeholder, disabled=True
+        )
+        if policy is None:
+            return False
+
+        self.policy = policy
+        return True
+
+    async def claim(self, user_id: int):
+        """
+        Hand a pooled account to the user, enabling it with a new password
+
+        Args:
+            user_id (int): Discord user ID claiming the account
+
+        Returns:
+            tuple: The username and password of the account, or None if the
+                pool is empty or the account couldn't be enabled
+        """
+        deletion_time = datetime.datetime.now() + datetime.timedelta(
+            minutes=config.ACCOUNT_TIME * 60
+        )
+        account = await claim_pool_account(user_id, deletion_time)
+        if account is None:
+            return None
+
+        jellyfin_user_id, username = account
+        _, password = generate_credentials()
+        try:
+            policy = await self.get_policy(jellyfin_user_id)
+            # Enable the account and set its password at the same time
+            statuses = await asyncio.gather(
+                self.http.post(
+                    "jellyfin",
+                    f"{config.JELLYFIN_URL}/Users/{jellyfin_user_id}/Policy",
+                    headers=config.JELLYFIN_HEADERS,
+                    json={**policy, "IsDisabled": False},
+                ),
+                self.http.post(
+                    "jellyfin",
+                    f"{config.JELLYFIN_URL}/Users/{jellyfin_user_id}/Password",
+                    headers=config.JELLYFIN_HEADERS,
+                    json={"NewPw": password},
+                ),
+            )
+            if any(status != 204 for status, _ in statuses):
+                raise Exception(
+                    f"Jellyfin returned {[status for status, _ in statuses]}"
+                )
+        except Exception as e:
+            config.LOG.error(f"Failed enabling pooled Jellyfin account: {e}")
+            # The account may be half enabled, so get rid of it entirely.
+            # If that fails it is still deleted once it expires
+            if await delete_jellyfin_user(self.http, jellyfin_user_id):
+                await remove_accounts([jellyfin_user_id])
+            return None
+
+        return username, password
+
+    async def get_policy(self, jellyfin_user_id: str) -> dict:
+        """
+        Get the policy of the pooled accounts, fetching it from Jellyfin if
+        no account has been created since starting up
+
+        Args:
+            jellyfin_user_id (str): The ID of a pooled Jellyfin user
+
+        Returns:
+            dict: The account policy
+        """
+        if self.policy is None:
+            status, user = await self.http.get(
+                "jellyfin",
+                f"{config.JELLYFIN_URL}/Users/{jellyfin_user_id}",
+                headers=config.JELLYFIN_HEADERS,
+            )
+            if status != 200:
+                raise Exception(f"Jellyfin returned {status}")
+            self.policy = user["Policy"]
+        return self.policy
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import socket
+import uuid
+
+import utils.config as config
+from utils.repository import acquire_lease, release_lease
+
+
+class LeaderLock:
+    """
+    Elect a single leader among the bot processes sharing a database,
+    through a lease that the leader renews and the others try to take over
+    once it expires. Work that must only run once (e.g. deleting expired
+    accounts) is started when this process is elected and stopped when it
+    loses the lease
+    """
+
+    def __init__(self, name: str, lease: float, on_elected, on_demoted):
+        """
+        Args:
+            name (str): The name of the lease
+            lease (float): How long the lease is valid for, in seconds
+            on_elected (function): Called once this process becomes leader
+            on_demoted (function): Called once this process stops being
+                leader
+        """
+        self.name = name
+        self.lease = lease
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.holder = (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.is_leader = False
+        self._task = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """
+        Stop campaigning, handing the lease over if this process holds it
+        """
+        if self._task:
+            self._task.cancel()
+        if self.is_leader:
+            self.is_leader = False
+            self.on_demoted()
+            try:
+                await release_lease(self.name, self.holder)
+            except Exception as e:
+                config.LOG.error(
+                    f"Failed releasing the {self.name} lease: {e}"
+                )
+
+    def set_leader(self, is_leader: bool) -> None:
+        if is_leader == self.is_leader:
+            return
+        self.is_leader = is_leader
+        if is_leader:
+            config.LOG.info(f"Elected {self.name} as {self.holder}")
+            self.on_elected()
+        else:
+            config.LOG.warning(f"No longer {self.name}, stopping its tasks")
+            self.on_demoted()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                acquired = await acquire_lease(
+                    self.name, self.holder, self.lease
+                )
+            except Exception as e:
+                # Without the database the lease can't be renewed, so
+                # assume another process will take over
+                config.LOG.error(f"Failed renewing the {self.name} lease: {e}")
+                acquired = False
+            self.set_leader(acquired)
+            # Renew well before the lease expires
+            await asyncio.sleep(self.lease / 3)
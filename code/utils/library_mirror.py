@@ -0,0 +1,72 @@
+class LibraryMirror:
+    """
+    In-memory mirror of the Radarr/Sonarr libraries indexed by `tmdbId`/
+    `tvdbId`, so whether content is already added can be told without a
+    lookup. Kept up to date by the periodic library refresh, the content
+    added by the bot and the add/delete webhook events
+    """
+
+    def __init__(self):
+        # TMDB/TVDB ID -> ID of the content in Radarr/Sonarr
+        self._content = {"radarr": {}, "sonarr": {}}
+        self._synced = {"radarr": False, "sonarr": False}
+
+    @staticmethod
+    def external_id(service: str, content: dict) -> int:
+        return content.get("tmdbId" if service == "radarr" else "tvdbId")
+
+    def is_synced(self, service: str) -> bool:
+        return self._synced[service]
+
+    def get(self, service: str, content_id: int) -> int:
+        """
+        Get the ID of content in the library
+
+        Args:
+            service (str): The service the content belongs to
+            content_id (int): The TMDB (radarr) or TVDB (sonarr) ID
+
+        Returns:
+            int: The ID of the content in Radarr/Sonarr, None if it isn't
+                in the library
+        """
+        return self._content[service].get(content_id)
+
+    def sync(self, service: str, library: list) -> tuple:
+        """
+        Bring the mirror of a library up to date, only touching the content
+        that was added or removed since the last sync
+
+        Args:
+            service (str): The service the library belongs to
+            library (list): The movies/series of the library
+
+        Returns:
+            tuple: The number of pieces of content added and removed
+        """
+        mirror = self._content[service]
+        current = {}
+        for content in library:
+            content_id = self.external_id(service, content)
+            if content_id:
+                current[content_id] = content["id"]
+
+        removed = [
+            content_id for content_id in mirror if content_id not in current
+        ]
+        for content_id in removed:
+            del mirror[content_id]
+        added = 0
+        for content_id, local_id in current.items():
+            if mirror.get(content_id) != local_id:
+                mirror[content_id] = local_id
+                added += 1
+
+        self._synced[service] = True
+        return added, len(removed)
+
+    def add(self, service: str, content_id: int, local_id: int) -> None:
+        self._content[service][content_id] = local_id
+
+    def remove(self, service: str, content_id: int) -> None:
+        self._content[service].pop(content_id, None)
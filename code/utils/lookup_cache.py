@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict
+
+
+class LookupCache:
+    """
+    LRU + TTL cache of Radarr/Sonarr lookup results
+
+    Search results are cached by service and normalized query, and every
+    result payload is also cached by service and TMDB/TVDB ID so it can be
+    reused when the content is added
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._searches = OrderedDict()
+        self._items = OrderedDict()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """
+        Normalize a query so that trivially different searches share an entry
+
+        Args:
+            query (str): The query to normalize
+
+        Returns:
+            str: The normalized query
+        """
+        return " ".join(query.lower().split())
+
+    def get_search(self, service: str, query: str):
+        return self._get(self._searches, (service, self.normalize(query)))
+
+    def put_search(self, service: str, query: str, results: list) -> None:
+        self._put(self._searches, (service, self.normalize(query)), results)
+
+    def get_item(self, service: str, content_id: int):
+        return self._get(self._items, (service, content_id))
+
+    def put_item(self, service: str, content_id: int, payload: dict) -> None:
+        self._put(self._items, (service, content_id), payload)
+
+    def invalidate(self, service: str, content_id: int) -> None:
+        """
+        Drop every cached entry containing the given content, used once the
+        content has been added and the cached "added" state is outdated
+
+        Args:
+            service (str): The service the content belongs to
+            content_id (int): The TMDB/TVDB ID of the content
+        """
+        id_str = "tmdbId" if service == "radarr" else "tvdbId"
+        self._items.pop((service, content_id), None)
+        for key, (_, results) in list(self._searches.items()):
+            if key[0] == service and any(
+                result.get(id_str) == content_id for result in results
+            ):
+                del self._searches[key]
+
+    def clear(self) -> None:
+        """
+        Drop every cached entry, used when the Radarr/Sonarr settings change
+        """
+        self._searches.clear()
+        self._items.clear()
+
+    def _get(self, store: OrderedDict, key: tuple):
+        entry = store.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            store.pop(key, None)
+            self.misses += 1
+            return None
+
+        store.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def _put(self, store: OrderedDict, key: tuple, value) -> None:
+        store[key] = (time.monotonic() + self.ttl, value)
+        store.move_to_end(key)
+        # Evict the least recently used entries
+        while len(store) > self.max_size:
+            store.popitem(last=False)
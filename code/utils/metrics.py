@@ -0,0 +1,269 @@
+import asyncio
+import math
+import time
+import discord
+from discord import app_commands
+from aiohttp import web
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+
+"""
+Prometheus metrics for slash commands, upstream services, the database,
+caches and the event loop, served over a local HTTP endpoint
+"""
+
+COMMAND_DURATION = Histogram(
+    "cordarr_command_duration_seconds",
+    "Time from a slash command being sent to it finishing",
+    ["command", "outcome", "shard"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+)
+UPSTREAM_REQUESTS = Counter(
+    "cordarr_upstream_requests_total",
+    "Requests sent to Radarr/Sonarr/Jellyfin",
+    ["service", "method", "status"],
+)
+UPSTREAM_DURATION = Histogram(
+    "cordarr_upstream_request_duration_seconds",
+    "Duration of requests sent to Radarr/Sonarr/Jellyfin",
+    ["service", "method"],
+)
+DB_QUERY_DURATION = Histogram(
+    "cordarr_db_query_duration_seconds",
+    "Duration of database queries",
+    ["statement"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+EVENT_LOOP_LAG = Gauge(
+    "cordarr_event_loop_lag_seconds",
+    "How late the last event loop lag probe woke up",
+)
+EVENT_LOOP_LAG_DURATION = Histogram(
+    "cordarr_event_loop_lag_duration_seconds",
+    "How late the event loop lag probes woke up",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+
+# Interval of the event loop lag probe, in seconds
+LAG_PROBE_INTERVAL = 0.5
+
+
+def observe_upstream(
+    service: str, method: str, status, started: float
+) -> None:
+    """
+    Record a request sent to an upstream service
+
+    Args:
+        service (str): The upstream service (radarr, sonarr, jellyfin)
+        method (str): The HTTP method
+        status (int): The status code, or None if the request failed
+        started (float): `time.perf_counter()` when the request was sent
+    """
+    UPSTREAM_DURATION.labels(service, method).observe(
+        time.perf_counter() - started
+    )
+    UPSTREAM_REQUESTS.labels(
+        service, method, "error" if status is None else str(status)
+    ).inc()
+
+
+def shard_id(interaction: discord.Interaction) -> int:
+    """
+    Get the shard an interaction was received on, Discord sends the events
+    of a guild to shard `(guild_id >> 22) % shard_count` and DMs to shard 0
+
+    Args:
+        interaction (discord.Interaction): The interaction
+
+    Returns:
+        int: The ID of the shard
+    """
+    if interaction.guild_id is None:
+        return 0
+    return (interaction.guild_id >> 22) % (interaction.client.shard_count or 1)
+
+
+def instrument_engine(engine) -> None:
+    """
+    Time every query run through the database engine
+
+    Args:
+        engine (AsyncEngine): The database engine
+    """
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, many):
+        context.query_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, many):
+        DB_QUERY_DURATION.labels(statement.split(None, 1)[0].upper()).observe(
+            time.perf_counter() - context.query_started
+        )
+
+
+class CacheCollector:
+    """
+    Report the hits and misses of the bot's lookup cache
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    def collect(self):
+        cache = self.bot.lookup_cache
+        if cache is None:
+            return
+        hits = CounterMetricFamily(
+            "cordarr_lookup_cache_hits", "Lookup cache hits"
+        )
+        hits.add_metric([], cache.hits)
+        misses = CounterMetricFamily(
+            "cordarr_lookup_cache_misses", "Lookup cache misses"
+        )
+        misses.add_metric([], cache.misses)
+        total = cache.hits + cache.misses
+        ratio = GaugeMetricFamily(
+            "cordarr_lookup_cache_hit_ratio", "Share of lookup cache hits"
+        )
+        ratio.add_metric([], cache.hits / total if total else 0.0)
+        yield from (hits, misses, ratio)
+
+
+class ShardCollector:
+    """
+    Report the gateway latency of the shards run by this process, and
+    whether it is the leader running the background tasks
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    def collect(self):
+        latency = GaugeMetricFamily(
+            "cordarr_shard_latency_seconds",
+            "Gateway heartbeat latency of each shard",
+            labels=["shard"],
+        )
+        for shard, seconds in self.bot.latencies:
+            # Shards that haven't sent a heartbeat yet have no latency
+            if math.isfinite(seconds):
+                latency.add_metric([str(shard)], seconds)
+        leader = GaugeMetricFamily(
+            "cordarr_leader", "Whether this process is the leader"
+        )
+        leader.add_metric(
+            # A single process always runs the background tasks
+            [],
+            int(self.bot.leader is None or self.bot.leader.is_leader),
+        )
+        yield from (latency, leader)
+
+
+def record_command(interaction: discord.Interaction, outcome: str) -> None:
+    """
+    Record how long a slash command took to complete, measured from when the
+    interaction was created on Discord's side
+
+    Args:
+        interaction (discord.Interaction): The interaction of the command
+        outcome (str): success or error
+    """
+    # Only once per command, and not for autocomplete requests
+    if not interaction.extras.pop("timed", False):
+        return
+    COMMAND_DURATION.labels(
+        interaction.command.qualified_name,
+        outcome,
+        str(shard_id(interaction)),
+    ).observe(
+        (discord.utils.utcnow() - interaction.created_at).total_seconds()
+    )
+
+
+class InstrumentedCommandTree(app_commands.CommandTree):
+    """
+    Command tree marking the slash commands to time. Successful commands are
+    recorded by the bot's `on_app_command_completion` event, failed ones by
+    `on_error`, which then hands the error to `error_handler` if one is set
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.error_handler = None
+
+    async def interaction_check(
+        self, interaction: discord.Interaction
+    ) -> bool:
+        if interaction.type is discord.InteractionType.application_command:
+            interaction.extras["timed"] = True
+        return True
+
+    async def on_error(
+        self,
+        interaction: discord.Interaction,
+        error: app_commands.AppCommandError,
+    ) -> None:
+        if interaction.command is not None:
+            record_command(interaction, "error")
+        if self.error_handler is not None:
+            await self.error_handler(interaction, error)
+        else:
+            await super().on_error(interaction, error)
+
+
+async def probe_event_loop_lag() -> None:
+    """
+    Measure how late the event loop runs a callback scheduled in advance
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LAG_PROBE_INTERVAL
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        lag = max(0.0, loop.time() - expected)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_DURATION.observe(lag)
+
+
+class MetricsServer:
+    """
+    Serve the metrics over HTTP for Prometheus to scrape
+    """
+
+    def __init__(self, bot, host: str, port: int):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.runner = None
+        self._lag_probe = None
+        REGISTRY.register(CacheCollector(bot))
+        REGISTRY.register(ShardCollector(bot))
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self._lag_probe = asyncio.create_task(probe_event_loop_lag())
+
+    async def stop(self) -> None:
+        if self._lag_probe:
+            self._lag_probe.cancel()
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=generate_latest(),
+            headers={"Content-Type": CONTENT_TYPE_LATEST},
+        )
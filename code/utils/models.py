@@ -1,9 +1,11 @@
 from sqlalchemy import (
     Column,
     Integer,
+    Float,
     String,
     DateTime,
     BigInteger,
+    Index,
 )
 
 
@@ -12,20 +14,48 @@ from utils.database import Base
 
 class Requests(Base):
     __tablename__ = "requests"
+    __table_args__ = (
+        Index("ix_requests_user_id_local_id", "user_id", "local_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String)
     release_year = Column(Integer)
-    local_id = Column(Integer)
+    local_id = Column(Integer, index=True)
     tmdbid = Column(Integer)
     tvdbid = Column(Integer)
     user_id = Column(BigInteger)
+    # Set from Radarr/Sonarr webhook events and by the status reconciler
+    state = Column(String)
+    progress = Column(Float)
+    time_left = Column(String)
+    percent_of_episodes = Column(Float)
+    last_checked = Column(DateTime)
 
 
 class JellyfinAccounts(Base):
     __tablename__ = "jellyfin_accounts"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(BigInteger)
-    jellyfin_user_id = Column(String)
-    deletion_time = Column(DateTime)
+    user_id = Column(BigInteger, index=True)
+    jellyfin_user_id = Column(String, unique=True, index=True)
+    deletion_time = Column(DateTime, index=True)
+    # Pooled accounts have no user_id until they are claimed
+    username = Column(String)
+
+
+class SyncMarks(Base):
+    __tablename__ = "sync_marks"
+
+    # Where syncing from a service (e.g. its history) left off
+    name = Column(String, primary_key=True)
+    last_date = Column(DateTime)
+    last_id = Column(Integer)
+
+
+class Leases(Base):
+    __tablename__ = "leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String)
+    expires_at = Column(DateTime)
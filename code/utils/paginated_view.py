@@ -0,0 +1,37 @@
+import discord
+
+"""
+View containing "Previous" and "Next" buttons to flip through embeds
+"""
+
+
+class PaginatedView(discord.ui.View):
+    def __init__(self, embeds: list, *, timeout=180.0):
+        super().__init__(timeout=timeout)
+        self.embeds = embeds
+        self.page = 0
+        self.update_buttons()
+
+    def update_buttons(self) -> None:
+        self.previous_button.disabled = self.page == 0
+        self.next_button.disabled = self.page == len(self.embeds) - 1
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_button(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        self.page -= 1
+        self.update_buttons()
+        await interaction.response.edit_message(
+            embed=self.embeds[self.page], view=self
+        )
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_button(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        self.page += 1
+        self.update_buttons()
+        await interaction.response.edit_message(
+            embed=self.embeds[self.page], view=self
+        )
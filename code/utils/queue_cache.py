@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import utils.config as config
+from utils.http_client import HTTPClient
+
+
+class QueueCache:
+    """
+    Bot-wide snapshot of the Radarr/Sonarr download queues
+
+    The snapshot is kept up to date by a background task and indexed by
+    `movieId`/`seriesId`, so `/status` lookups never have to hit the
+    services themselves
+    """
+
+    def __init__(self, http: HTTPClient, max_age: float, page_size: int):
+        self.http = http
+        self.max_age = max_age
+        self.page_size = page_size
+        self._queues = {"radarr": {}, "sonarr": {}}
+        self._updated = {"radarr": 0.0, "sonarr": 0.0}
+        self._refreshing = {}
+
+    async def get(self, service: str) -> dict:
+        """
+        Get the queue of a service, refreshing it first if it is stale
+
+        Args:
+            service (str): The service to get the queue of
+
+        Returns:
+            dict: The queue records indexed by movieId/seriesId
+        """
+        if time.monotonic() - self._updated[service] > self.max_age:
+            try:
+                await self.refresh(service)
+            except Exception as e:
+                # Fall back to the last snapshot that could be fetched
+                config.LOG.error(f"Failed refreshing the {service} queue: {e}")
+        return self._queues[service]
+
+    async def refresh(self, service: str) -> None:
+        """
+        Refresh the queue of a service. Concurrent callers share the same
+        in-flight request instead of each downloading the queue
+
+        Args:
+            service (str): The service to refresh the queue of
+        """
+        task = self._refreshing.get(service)
+        if task is None:
+            task = asyncio.create_task(self._fetch(service))
+            self._refreshing[service] = task
+            task.add_done_callback(
+                lambda _: self._refreshing.pop(service, None)
+            )
+        # Shield so a cancelled caller doesn't cancel the shared refresh
+        await asyncio.shield(task)
+
+    async def _fetch(self, service: str) -> None:
+        if service == "radarr":
+            host, headers = config.RADARR_HOST_URL, config.RADARR_HEADERS
+        else:
+            host, headers = config.SONARR_HOST_URL, config.SONARR_HEADERS
+
+        id_str = "movieId" if service == "radarr" else "seriesId"
+        records = {}
+        async for download in iter_queue(
+            self.http, service, host, headers, self.page_size
+        ):
+            # Skip downloads not linked to anything in the library
+            if download.get(id_str) is None:
+                continue
+            # Collapse per-episode records into one entry per series
+            records.setdefault(int(download[id_str]), download)
+
+        self._queues[service] = records
+        self._updated[service] = time.monotonic()
+
+
+async def iter_queue(
+    http: HTTPClient, service: str, host: str, headers: dict, page_size: int
+):
+    """
+    Iterate over every record of a service's download queue. The first page
+    is used to find the total number of records, then all remaining pages
+    are fetched concurrently and their records yielded as they arrive
+
+    Args:
+        http (HTTPClient): The shared HTTP client
+        service (str): The service to get the queue of
+        host (str): The host URL
+        headers (dict): The headers for the request
+        page_size (int): The number of records to request per page
+
+    Yields:
+        dict: A queue record
+    """
+
+    async def get_page(page: int) -> dict:
+        status, queue = await http.get(
+            service,
+            f"{host}/api/v3/queue",
+            params={"page": page, "pageSize": page_size},
+            headers=headers,
+        )
+        # Raise so the previous snapshot of the queue is kept
+        if status != 200:
+            raise Exception(f"{service} returned {status} getting the queue")
+        return queue
+
+    first_page = await get_page(1)
+    for download in first_page["records"]:
+        yield download
+
+    total_pages = -(-first_page["totalRecords"] // page_size)
+    pending = [
+        asyncio.create_task(get_page(page))
+        for page in range(2, total_pages + 1)
+    ]
+    try:
+        for next_page in asyncio.as_completed(pending):
+            queue = await next_page
+            for download in queue["records"]:
+                yield download
+    finally:
+        # Don't leave requests running if the caller stops early
+        for task in pending:
+            task.cancel()
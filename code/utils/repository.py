@@ -0,0 +1,499 @@
+import datetime
+from sqlalchemy import and_, bindparam, delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from utils.database import Session
+from utils.models import Requests, JellyfinAccounts, Leases, SyncMarks
+
+
+def content_filter(service: str, local_id: int) -> tuple:
+    """
+    Get the filters matching the requests of a piece of content
+
+    Args:
+        service (str): The service the content belongs to
+        local_id (int): The ID of the content in Radarr/Sonarr
+
+    Returns:
+        tuple: The SQLAlchemy filter clauses
+    """
+    return (
+        Requests.local_id == local_id,
+        (
+            Requests.tmdbid.isnot(None)
+            if service == "radarr"
+            else Requests.tvdbid.isnot(None)
+        ),
+    )
+
+
+#
+# Requests
+#
+
+
+async def get_user_requests(user_id: int) -> list:
+    """
+    Get the content requested by a user
+
+    Args:
+        user_id (int): The ID of the user
+
+    Returns:
+        list: (title, release_year, local_id, tmdbid, tvdbid, state,
+            progress, time_left, percent_of_episodes, last_checked) rows
+    """
+    async with Session() as session:
+        result = await session.execute(
+            select(
+                Requests.title,
+                Requests.release_year,
+                Requests.local_id,
+                Requests.tmdbid,
+                Requests.tvdbid,
+                Requests.state,
+                Requests.progress,
+                Requests.time_left,
+                Requests.percent_of_episodes,
+                Requests.last_checked,
+            ).where(Requests.user_id == user_id)
+        )
+        return result.all()
+
+
+async def get_requested_content() -> dict:
+    """
+    Get every piece of requested content that hasn't finished downloading,
+    once no matter how many users requested it
+
+    Returns:
+        dict: (service, local_id) -> (state, checked), where checked is
+            False if a request for the content still has to be checked
+    """
+    async with Session() as session:
+        result = await session.execute(
+            select(
+                Requests.local_id,
+                Requests.tmdbid.isnot(None),
+                Requests.state,
+                Requests.last_checked,
+            ).where(
+                or_(
+                    Requests.state.is_(None),
+                    Requests.state.notin_(["DOWNLOADED", "REMOVED"]),
+                )
+            )
+        )
+        content = {}
+        for local_id, is_movie, state, last_checked in result.all():
+            key = ("radarr" if is_movie else "sonarr", local_id)
+            _, checked = content.get(key, (state, True))
+            content[key] = (state, checked and last_checked is not None)
+        return content
+
+
+async def add_requests(requests: list) -> None:
+    """
+    Store new requests in one transaction
+
+    Args:
+        requests (list): The Requests to store
+    """
+    async with Session() as session:
+        session.add_all(requests)
+        await session.commit()
+
+
+async def delete_user_requests(user_id: int, content: list) -> None:
+    """
+    Remove the requests of a user for the given content
+
+    Args:
+        user_id (int): The ID of the user
+        content (list): (service, local_id) tuples of the content, as the
+            same ID can be used by both Radarr and Sonarr
+    """
+    async with Session() as session:
+        await session.execute(
+            delete(Requests)
+            .where(Requests.user_id == user_id)
+            .where(
+                or_(
+                    *[
+                        and_(*content_filter(service, local_id))
+                        for service, local_id in content
+                    ]
+                )
+            )
+        )
+        await session.commit()
+
+
+async def set_content_state(service: str, local_id: int, state: str) -> None:
+    """
+    Set the state of every request for a piece of content
+
+    Args:
+        service (str): The service the content belongs to
+        local_id (int): The ID of the content in Radarr/Sonarr
+        state (str): The new state
+    """
+    async with Session() as session:
+        await session.execute(
+            update(Requests)
+            .where(*content_filter(service, local_id))
+            .values(state=state)
+        )
+        await session.commit()
+
+
+async def set_content_statuses(service: str, statuses: list) -> None:
+    """
+    Store the status of many pieces of content in one transaction, updating
+    the requests of every user
+
+    Args:
+        service (str): The service the content belongs to
+        statuses (list): Dicts with the local_id, state, progress,
+            time_left and percent_of_episodes of each piece of content
+    """
+    now = datetime.datetime.now()
+    async with Session() as session:
+        await session.execute(
+            update(Requests.__table__)
+            .where(*content_filter(service, bindparam("content_id")))
+            .values(
+                state=bindparam("state"),
+                progress=bindparam("progress"),
+                time_left=bindparam("time_left"),
+                percent_of_episodes=bindparam("percent_of_episodes"),
+                last_checked=now,
+            ),
+            [
+                {
+                    "content_id": status["local_id"],
+                    "state": status["state"],
+                    "progress": status["progress"],
+                    "time_left": status["time_left"],
+                    "percent_of_episodes": status["percent_of_episodes"],
+                }
+                for status in statuses
+            ],
+        )
+        await session.commit()
+
+
+async def apply_content_events(service: str, events: dict) -> None:
+    """
+    Move content to the state set by a Radarr/Sonarr event, updating the
+    requests of every user in one transaction
+
+    Args:
+        service (str): The service the content belongs to
+        events (dict): The local ID of each piece of content -> its new
+            state, or None if it needs to be checked again
+    """
+    now = datetime.datetime.now()
+    changed = [
+        {"content_id": local_id, "state": state}
+        for local_id, state in events.items()
+        if state is not None
+    ]
+    unknown = [
+        {"content_id": local_id}
+        for local_id, state in events.items()
+        if state is None
+    ]
+    async with Session() as session:
+        if changed:
+            await session.execute(
+                update(Requests.__table__)
+                .where(*content_filter(service, bindparam("content_id")))
+                .values(
+                    state=bindparam("state"),
+                    progress=None,
+                    time_left=None,
+                    last_checked=now,
+                ),
+                changed,
+            )
+        if unknown:
+            await session.execute(
+                update(Requests.__table__)
+                .where(*content_filter(service, bindparam("content_id")))
+                .values(last_checked=None),
+                unknown,
+            )
+        await session.commit()
+
+
+async def pop_content_requests(service: str, local_id: int) -> list:
+    """
+    Remove every request for a piece of content
+
+    Args:
+        service (str): The service the content belongs to
+        local_id (int): The ID of the content in Radarr/Sonarr
+
+    Returns:
+        list: (title, user_id) rows of the removed requests
+    """
+    # Deleting and reading the rows in one statement means two callers
+    # can't both notify about the same request
+    async with Session() as session:
+        result = await session.execute(
+            delete(Requests)
+            .where(*content_filter(service, local_id))
+            .returning(Requests.title, Requests.user_id)
+        )
+        requests = result.all()
+        await session.commit()
+        return requests
+
+
+#
+# Jellyfin accounts
+#
+
+
+async def get_user_account(user_id: int) -> JellyfinAccounts:
+    """
+    Get the Jellyfin account of a user
+
+    Args:
+        user_id (int): The ID of the user
+
+    Returns:
+        JellyfinAccounts: The account, or None if the user has none
+    """
+    async with Session() as session:
+        result = await session.execute(
+            select(JellyfinAccounts)
+            .where(JellyfinAccounts.user_id == user_id)
+            .limit(1)
+        )
+        return result.scalar()
+
+
+async def add_account(
+    user_id: int,
+    jellyfin_user_id: str,
+    deletion_time: datetime.datetime,
+    username: str = None,
+) -> None:
+    """
+    Store a new Jellyfin account
+
+    Args:
+        user_id (int): The ID of the user owning the account, None for
+            pooled accounts
+        jellyfin_user_id (str): The ID of the Jellyfin user
+        deletion_time (datetime.datetime): When the account expires
+        username (str): The Jellyfin username, only needed for pooled
+            accounts
+    """
+    async with Session() as session:
+        session.add(
+            JellyfinAccounts(
+                user_id=user_id,
+                jellyfin_user_id=jellyfin_user_id,
+                deletion_time=deletion_time,
+                username=username,
+            )
+        )
+        await session.commit()
+
+
+async def count_pool_accounts() -> int:
+    """
+    Count the pooled accounts that haven't been claimed yet
+
+    Returns:
+        int: The number of unclaimed accounts
+    """
+    async with Session() as session:
+        result = await session.execute(
+            select(func.count()).where(JellyfinAccounts.user_id.is_(None))
+        )
+        return result.scalar()
+
+
+async def claim_pool_account(
+    user_id: int, deletion_time: datetime.datetime
+) -> tuple:
+    """
+    Atomically hand an unclaimed pooled account to a user
+
+    Args:
+        user_id (int): The ID of the user claiming the account
+        deletion_time (datetime.datetime): When the account expires
+
+    Returns:
+        tuple: The Jellyfin user ID and username of the account, or None if
+            the pool is empty
+    """
+    unclaimed = (
+        select(JellyfinAccounts.id)
+        .where(JellyfinAccounts.user_id.is_(None))
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with Session() as session:
+        # The user_id check stops two claims from taking the same row
+        result = await session.execute(
+            update(JellyfinAccounts)
+            .where(JellyfinAccounts.id == unclaimed)
+            .where(JellyfinAccounts.user_id.is_(None))
+            .values(user_id=user_id, deletion_time=deletion_time)
+            .returning(
+                JellyfinAccounts.jellyfin_user_id, JellyfinAccounts.username
+            )
+        )
+        account = result.first()
+        await session.commit()
+        return account
+
+
+async def get_accounts() -> list:
+    """
+    Get every stored Jellyfin account, including unclaimed pooled accounts
+
+    Returns:
+        list: (jellyfin_user_id, deletion_time) rows
+    """
+    async with Session() as session:
+        result = await session.execute(
+            select(
+                JellyfinAccounts.jellyfin_user_id,
+                JellyfinAccounts.deletion_time,
+            )
+        )
+        return result.all()
+
+
+async def remove_accounts(jellyfin_user_ids: list) -> None:
+    """
+    Remove Jellyfin accounts in one statement
+
+    Args:
+        jellyfin_user_ids (list): The IDs of the Jellyfin users
+    """
+    async with Session() as session:
+        await session.execute(
+            delete(JellyfinAccounts).where(
+                JellyfinAccounts.jellyfin_user_id.in_(jellyfin_user_ids)
+            )
+        )
+        await session.commit()
+
+
+async def get_next_deletion_time() -> datetime.datetime:
+    """
+    Get the earliest deletion time of all accounts
+
+    Returns:
+        datetime.datetime: The deletion time, or None if there are no accounts
+    """
+    async with Session() as session:
+        result = await session.execute(
+            select(func.min(JellyfinAccounts.deletion_time))
+        )
+        return result.scalar()
+
+
+#
+# Sync marks
+#
+
+
+async def get_sync_mark(name: str) -> tuple:
+    """
+    Get where syncing something left off
+
+    Args:
+        name (str): The name of what is synced
+
+    Returns:
+        tuple: The date and ID of the last synced record, or None if it
+            was never synced
+    """
+    async with Session() as session:
+        mark = await session.get(SyncMarks, name)
+        return None if mark is None else (mark.last_date, mark.last_id)
+
+
+async def set_sync_mark(
+    name: str, last_date: datetime.datetime, last_id: int
+) -> None:
+    """
+    Store where syncing something left off
+
+    Args:
+        name (str): The name of what is synced
+        last_date (datetime.datetime): The date of the last synced record
+        last_id (int): The ID of the last synced record
+    """
+    async with Session() as session:
+        await session.merge(
+            SyncMarks(name=name, last_date=last_date, last_id=last_id)
+        )
+        await session.commit()
+
+
+#
+# Leases
+#
+
+
+async def acquire_lease(name: str, holder: str, duration: float) -> bool:
+    """
+    Take or renew a named lease, unless another holder's lease is still
+    valid
+
+    Args:
+        name (str): The name of the lease
+        holder (str): The ID of the process taking the lease
+        duration (float): How long the lease is valid for, in seconds
+
+    Returns:
+        bool: Whether or not the lease is now held by `holder`
+    """
+    # UTC, since the processes sharing a lease may run in other timezones
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    expires_at = now + datetime.timedelta(seconds=duration)
+    async with Session() as session:
+        result = await session.execute(
+            update(Leases)
+            .where(Leases.name == name)
+            .where(or_(Leases.holder == holder, Leases.expires_at < now))
+            .values(holder=holder, expires_at=expires_at)
+        )
+        if result.rowcount:
+            await session.commit()
+            return True
+
+        # Either the lease is held by someone else or it was never taken
+        session.add(Leases(name=name, holder=holder, expires_at=expires_at))
+        try:
+            await session.commit()
+        except IntegrityError:
+            return False
+        return True
+
+
+async def release_lease(name: str, holder: str) -> None:
+    """
+    Give up a lease so another process can take it right away
+
+    Args:
+        name (str): The name of the lease
+        holder (str): The ID of the process holding the lease
+    """
+    async with Session() as session:
+        await session.execute(
+            delete(Leases)
+            .where(Leases.name == name)
+            .where(Leases.holder == holder)
+        )
+        await session.commit()
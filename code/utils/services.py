@@ -0,0 +1,186 @@
+import asyncio
+import aiohttp
+
+import utils.config as config
+from utils.http_client import HTTPClient
+
+
+class ServiceMonitor:
+    """
+    Check that Radarr, Sonarr and Jellyfin are reachable and configured
+    correctly. All services are checked at once with a strict timeout, and
+    a service failing its check is disabled and rechecked in the background
+    instead of keeping the bot from starting
+    """
+
+    def __init__(self, http: HTTPClient, timeout: float, interval: float):
+        self.http = http
+        self.timeout = timeout
+        self.interval = interval
+        # Results of the last check of each service
+        self.available = {}
+        self._task = None
+
+    def services(self) -> list:
+        """
+        Get the services set up in the config
+
+        Returns:
+            list: The names of the services
+        """
+        services = []
+        if config.RADARR_ENABLED:
+            services.append("radarr")
+        if config.SONARR_ENABLED:
+            services.append("sonarr")
+        if config.JELLYFIN_ENABLED:
+            services.append("jellyfin")
+        return services
+
+    def is_available(self, service: str) -> bool:
+        return self.available.get(service, False)
+
+    async def check_all(self) -> None:
+        """
+        Check every service concurrently
+        """
+        await asyncio.gather(
+            *[self.check(service) for service in self.services()]
+        )
+
+    async def check(self, service: str) -> bool:
+        """
+        Check a single service, disabling/re-enabling it based on the result
+
+        Args:
+            service (str): The service to check
+
+        Returns:
+            bool: Whether or not the service is available
+        """
+        try:
+            problem = await asyncio.wait_for(
+                (
+                    self.check_jellyfin()
+                    if service == "jellyfin"
+                    else self.check_arr(service)
+                ),
+                self.timeout,
+            )
+        except asyncio.TimeoutError:
+            problem = (
+                f"{service} did not respond within {self.timeout} seconds"
+            )
+        except aiohttp.ClientError as e:
+            problem = f"Unable to reach {service}: {e}"
+        # e.g. a non-JSON body or missing fields from an unexpected response,
+        # which would otherwise stop the startup or the rechecks
+        except Exception as e:
+            problem = f"Unexpected response from {service}: {e!r}"
+
+        previous = self.available.get(service)
+        self.available[service] = problem is None
+        # Only log changes, so rechecks of a down service don't spam the log
+        if problem is not None and previous is not False:
+            config.LOG.critical(
+                f"{problem}\n{service} is disabled until it passes a recheck"
+                f" (every {self.interval} seconds)"
+            )
+        elif problem is None and previous is False:
+            config.LOG.info(f"{service} passed its check and is re-enabled")
+        return problem is None
+
+    async def check_arr(self, service: str) -> str:
+        """
+        Check the API key, quality profile and root folder of Radarr/Sonarr
+
+        Args:
+            service (str): radarr or sonarr
+
+        Returns:
+            str: The problem found, or None if everything is valid
+        """
+        prefix = service.upper()
+        host = getattr(config, f"{prefix}_HOST_URL")
+        headers = getattr(config, f"{prefix}_HEADERS")
+        (profiles_status, profiles), (folders_status, folders) = (
+            await asyncio.gather(
+                self.http.get(
+                    service,
+                    f"{host}/api/v3/qualityProfile",
+                    headers=headers,
+                ),
+                self.http.get(
+                    service, f"{host}/api/v3/rootfolder", headers=headers
+                ),
+            )
+        )
+        if profiles_status != 200 or folders_status != 200:
+            return (
+                f"Error in config.yaml: Unable to get {service} quality"
+                f" profiles. API Key invalid or incorrect {service} URL"
+            )
+
+        quality_profile_id = getattr(config, f"{prefix}_QUALITY_PROFILE_ID")
+        if quality_profile_id not in [profile["id"] for profile in profiles]:
+            available = "\n".join(
+                f"ID: {profile['id']} | Name: {profile['name']}"
+                for profile in profiles
+            )
+            return (
+                f"Error in config.yaml: Missing or invalid {service} quality"
+                " profile ID. Look below for your available profiles:\n"
+                f"{available}"
+            )
+
+        root_folder_path = getattr(config, f"{prefix}_ROOT_FOLDER_PATH")
+        if root_folder_path.rstrip("/") not in [
+            folder["path"].rstrip("/") for folder in folders
+        ]:
+            available = "\n".join(folder["path"] for folder in folders)
+            return (
+                f"Error in config.yaml: {root_folder_path} is not a {service}"
+                " root folder. Look below for your available root folders:\n"
+                f"{available}"
+            )
+        return None
+
+    async def check_jellyfin(self) -> str:
+        """
+        Check the Jellyfin URL and API key
+
+        Returns:
+            str: The problem found, or None if everything is valid
+        """
+        status, _ = await self.http.get(
+            "jellyfin",
+            f"{config.JELLYFIN_URL}/System/Info",
+            headers=config.JELLYFIN_HEADERS,
+        )
+        if status != 200:
+            return (
+                "Error in config.yaml: Unable to reach Jellyfin. API Key"
+                " invalid or incorrect Jellyfin URL"
+            )
+        return None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+
+    async def run(self) -> None:
+        """
+        Recheck the disabled services until they become available
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.gather(
+                *[
+                    self.check(service)
+                    for service in self.services()
+                    if not self.is_available(service)
+                ]
+            )
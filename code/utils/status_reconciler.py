@@ -0,0 +1,291 @@
+import asyncio
+import datetime
+import time
+import aiohttp
+
+from utils.http_client import HTTPClient
+from utils.queue_cache import QueueCache
+from utils.repository import (
+    apply_content_events,
+    get_requested_content,
+    get_sync_mark,
+    set_content_statuses,
+    set_sync_mark,
+)
+import utils.config as config
+
+# History events of content being imported from a finished download
+IMPORT_EVENTS = {
+    "downloadFolderImported",
+    "movieFolderImported",
+    "seriesFolderImported",
+}
+
+
+def history_transition(service: str, event_type: str) -> tuple:
+    """
+    Get the state a Radarr/Sonarr history event moves content to
+
+    Args:
+        service (str): The service the event comes from
+        event_type (str): The `eventType` of the history record
+
+    Returns:
+        tuple: Whether the event changes the state of content, and the new
+            state (None if the content has to be checked again)
+    """
+    if event_type == "grabbed":
+        return True, "GRABBED"
+    if event_type == "downloadFailed":
+        return True, "FAILED"
+    if event_type in IMPORT_EVENTS:
+        # A series is only finished once every episode has been imported
+        return True, "DOWNLOADED" if service == "radarr" else None
+    if event_type in ("movieFileDeleted", "episodeFileDeleted"):
+        return True, None
+    return False, None
+
+
+class StatusReconciler:
+    """
+    Keep the status stored with every request up to date, so `/status` only
+    has to read the database. Each piece of requested content is checked
+    once per run, no matter how many users requested it
+
+    Between full runs, only what changed is looked at: new events from the
+    Radarr/Sonarr history, the download queue, and content that was never
+    checked or needs to be checked again
+    """
+
+    def __init__(self, http: HTTPClient, queue_cache: QueueCache, services):
+        """
+        Args:
+            http (HTTPClient): The shared HTTP client
+            queue_cache (QueueCache): The shared download queue snapshot
+            services (ServiceMonitor): Skips the services that are down,
+                None to check every service
+        """
+        self.http = http
+        self.queue_cache = queue_cache
+        self.services = services
+        self._last_full_run = None
+
+    def is_available(self, service: str) -> bool:
+        return self.services is None or self.services.is_available(service)
+
+    async def sync(self) -> None:
+        """
+        Bring the stored statuses up to date from what changed since the
+        last sync, checking all requested content once per full reconcile
+        interval
+        """
+        for service in ("radarr", "sonarr"):
+            if self.is_available(service):
+                await self.apply_history(service)
+
+        if (
+            self._last_full_run is None
+            or time.monotonic() - self._last_full_run
+            >= config.STATUS_FULL_RECONCILE_INTERVAL
+        ):
+            started = time.monotonic()
+            await self.reconcile()
+            # A failed full run is retried on the next sync
+            self._last_full_run = started
+            return
+
+        content = await get_requested_content()
+        queues = {
+            service: await self.queue_cache.get(service)
+            for service in ("radarr", "sonarr")
+            if self.is_available(service)
+        }
+        to_check = []
+        for (service, local_id), (state, checked) in content.items():
+            if service not in queues:
+                continue
+            # Content in the queue (or that just left it) has its progress
+            # updated, everything else only changes through history events
+            if (
+                not checked
+                or local_id in queues[service]
+                or state == "DOWNLOADING"
+            ):
+                to_check.append((service, local_id))
+        if to_check:
+            await self.reconcile(to_check)
+
+    async def apply_history(self, service: str) -> None:
+        """
+        Apply the history events of a service since the last sync to the
+        requested content
+
+        Args:
+            service (str): The service to get the history of
+        """
+        name = f"history:{service}"
+        mark = await get_sync_mark(name)
+        # Start from now instead of replaying the whole history
+        if mark is None:
+            await set_sync_mark(
+                name,
+                datetime.datetime.now(datetime.timezone.utc).replace(
+                    tzinfo=None
+                ),
+                0,
+            )
+            return
+
+        last_date, last_id = mark
+        if service == "radarr":
+            host, headers = config.RADARR_HOST_URL, config.RADARR_HEADERS
+        else:
+            host, headers = config.SONARR_HOST_URL, config.SONARR_HEADERS
+        status, records = await self.http.get(
+            service,
+            f"{host}/api/v3/history/since",
+            params={"date": f"{last_date.isoformat()}Z"},
+            headers=headers,
+        )
+        if status != 200:
+            raise Exception(f"{service} returned {status} getting history")
+
+        id_str = "movieId" if service == "radarr" else "seriesId"
+        events = {}
+        for record in sorted(records, key=lambda record: record["id"]):
+            # Records from the last synced date are returned again
+            if record["id"] <= last_id:
+                continue
+            last_id = record["id"]
+            last_date = max(
+                last_date,
+                datetime.datetime.fromisoformat(record["date"]).replace(
+                    tzinfo=None
+                ),
+            )
+            changes_state, state = history_transition(
+                service, record["eventType"]
+            )
+            if changes_state and record.get(id_str):
+                # The latest event of each piece of content wins
+                events[record[id_str]] = state
+
+        if events:
+            await apply_content_events(service, events)
+        await set_sync_mark(name, last_date, last_id)
+
+    async def reconcile(self, content: list = None) -> list:
+        """
+        Check the status of requested content and store it
+
+        Args:
+            content (list): (service, local_id) tuples to check, None for
+                all requested content
+
+        Returns:
+            list: The status of each piece of content that was checked, as
+                dicts with its service, local_id, state, progress,
+                time_left and percent_of_episodes
+        """
+        if content is None:
+            content = await get_requested_content()
+
+        statuses = []
+        for service in ("radarr", "sonarr"):
+            local_ids = {
+                local_id
+                for content_service, local_id in content
+                if content_service == service
+            }
+            if not local_ids or not self.is_available(service):
+                continue
+
+            queue = await self.queue_cache.get(service)
+            # Pull the data for the content not in the queue concurrently,
+            # limited to the size of the connection pool
+            semaphore = asyncio.Semaphore(config.HTTP_POOL_SIZE)
+            results = await asyncio.gather(
+                *[
+                    self.check(service, local_id, queue, semaphore)
+                    for local_id in local_ids
+                ]
+            )
+            # Content that failed to be checked keeps its previous status
+            checked = [status for status in results if status is not None]
+            if checked:
+                await set_content_statuses(service, checked)
+            statuses += checked
+
+        return statuses
+
+    async def check(
+        self,
+        service: str,
+        local_id: int,
+        queue: dict,
+        semaphore: asyncio.Semaphore,
+    ) -> dict:
+        """
+        Get the status of a single piece of content
+
+        Args:
+            service (str): The service the content belongs to
+            local_id (int): The ID of the content in Radarr/Sonarr
+            queue (dict): The download queue of the service
+            semaphore (asyncio.Semaphore): Limits the concurrent requests
+
+        Returns:
+            dict: The status, or None if it couldn't be checked
+        """
+        status = {
+            "service": service,
+            "local_id": local_id,
+            "state": "NOT FOUND",
+            "progress": None,
+            "time_left": None,
+            "percent_of_episodes": None,
+        }
+        download = queue.get(local_id)
+        # If the content is being downloaded
+        if download is not None:
+            status["state"] = "DOWNLOADING"
+            status["time_left"] = download.get("timeleft")
+            if download.get("size"):
+                status["progress"] = (
+                    1 - download["sizeleft"] / download["size"]
+                )
+            return status
+
+        if service == "radarr":
+            url = f"{config.RADARR_HOST_URL}/api/v3/movie/{local_id}"
+            headers = config.RADARR_HEADERS
+        else:
+            url = f"{config.SONARR_HOST_URL}/api/v3/series/{local_id}"
+            headers = config.SONARR_HEADERS
+        try:
+            async with semaphore:
+                response_status, data = await self.http.get(
+                    service, url, headers=headers
+                )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+        # Content removed from the library won't be downloaded anymore
+        if response_status == 404:
+            status["state"] = "REMOVED"
+            return status
+        if response_status != 200:
+            return None
+
+        statistics = data.get("statistics") or {}
+        if "percentOfEpisodes" in statistics:
+            percent = statistics["percentOfEpisodes"]
+            status["percent_of_episodes"] = percent
+            if percent >= 100:
+                status["state"] = "DOWNLOADED"
+            elif percent > 0:
+                status["state"] = "PARTIAL"
+        # If the movie has a file, then it has finished downloading
+        elif data.get("hasFile"):
+            status["state"] = "DOWNLOADED"
+        return status
@@ -0,0 +1,235 @@
+import asyncio
+import discord
+
+import utils.config as config
+
+# Filters of the `/status` view, by the category of request they show
+FILTERS = {
+    None: "All requests",
+    "queued": "Downloading",
+    "not_found": "Not found",
+    "partial": "Partially downloaded",
+}
+
+
+class StatusPages:
+    """
+    The requests of a user split into pages. The status of a request is
+    only resolved (which may take a call to Radarr/Sonarr) once a page
+    containing it, or filtered by its status, is needed
+    """
+
+    def __init__(self, requests: list, resolve, page_size: int):
+        """
+        Args:
+            requests (list): Dicts with a "line" and "category" for each
+                request, both None until the request is resolved
+            resolve (coroutine function): Called with a list of unresolved
+                requests, sets their "line" and "category"
+            page_size (int): The number of requests on each page
+        """
+        self.requests = requests
+        self.resolve = resolve
+        self.page_size = page_size
+        # Index of each request being resolved -> resolving task
+        self._resolving = {}
+
+    def may_match(self, request: dict, category: str) -> bool:
+        if category is None:
+            return True
+        # Requests that aren't resolved yet may be in any category
+        if request["category"] is None:
+            return True
+        return request["category"] == category
+
+    async def ensure(self, indexes: list) -> None:
+        """
+        Resolve the requests that aren't resolved yet, sharing the requests
+        already being resolved (e.g. by a prefetch)
+
+        Args:
+            indexes (list): The indexes of the requests
+        """
+        unresolved = [
+            i
+            for i in indexes
+            if self.requests[i]["line"] is None and i not in self._resolving
+        ]
+        if unresolved:
+            task = asyncio.create_task(
+                self.resolve([self.requests[i] for i in unresolved])
+            )
+            for i in unresolved:
+                self._resolving[i] = task
+
+        tasks = {self._resolving[i] for i in indexes if i in self._resolving}
+        try:
+            # Shield so a cancelled prefetch doesn't cancel a shared task
+            await asyncio.gather(*[asyncio.shield(task) for task in tasks])
+        finally:
+            for i in indexes:
+                if i in self._resolving and self._resolving[i].done():
+                    del self._resolving[i]
+
+    async def get_page(self, page: int, category: str = None) -> tuple:
+        """
+        Get the requests on a page, resolving only as many requests as are
+        needed to fill it
+
+        Args:
+            page (int): The index of the page
+            category (str): The category to filter by, None for every request
+
+        Returns:
+            tuple: The requests on the page, and whether there is a next page
+        """
+        start = page * self.page_size
+        end = start + self.page_size
+        candidates = [
+            i
+            for i, request in enumerate(self.requests)
+            if self.may_match(request, category)
+        ]
+
+        if category is None:
+            matches = candidates
+        else:
+            # Resolve a page worth of candidates at a time, until one more
+            # request than needed is found
+            matches = []
+            position = 0
+            while position < len(candidates) and len(matches) <= end:
+                chunk = candidates[position : position + self.page_size]
+                position += self.page_size
+                await self.ensure(chunk)
+                matches += [
+                    i
+                    for i in chunk
+                    if self.requests[i]["category"] == category
+                ]
+
+        shown = matches[start:end]
+        await self.ensure(shown)
+        return [self.requests[i] for i in shown], len(matches) > end
+
+
+class StatusView(discord.ui.View):
+    """
+    View flipping through the pages of `/status` and filtering the
+    requests, prefetching the next page in the background
+    """
+
+    def __init__(self, pages: StatusPages, forget=None, *, timeout=180.0):
+        """
+        Args:
+            pages (StatusPages): The pages of requests
+            forget (coroutine function): Called with the requests on a page
+                once it has been shown, to remove the finished ones
+        """
+        super().__init__(timeout=timeout)
+        self.pages = pages
+        self.forget = forget
+        self.page = 0
+        self.category = None
+        self.shown = []
+        self._prefetches = set()
+
+    async def render(self) -> discord.Embed:
+        """
+        Resolve the current page and build its embed
+
+        Returns:
+            discord.Embed: The embed of the current page
+        """
+        requests, has_next = await self.pages.get_page(
+            self.page, self.category
+        )
+        self.shown = requests
+        self.previous_button.disabled = self.page == 0
+        self.next_button.disabled = not has_next
+        if has_next:
+            self.prefetch(self.page + 1)
+
+        embed = discord.Embed(
+            title="Requested Content",
+            description=(
+                "Below are the movies/shows you have requested that are"
+                " currently being downloaded:\n"
+            ),
+            color=0xD01B86,
+        )
+        if requests:
+            embed.description += "".join(
+                request["line"] for request in requests
+            )
+        else:
+            embed.description += (
+                "\nNone of your requested content matches this filter."
+            )
+        embed.set_footer(
+            text=f"Page {self.page + 1} | {FILTERS[self.category]}"
+        )
+        return embed
+
+    def prefetch(self, page: int) -> None:
+        """
+        Resolve a page in the background, so it is ready once shown
+        """
+        task = asyncio.create_task(self._get_page(page))
+        self._prefetches.add(task)
+        task.add_done_callback(self._prefetches.discard)
+
+    async def _get_page(self, page: int) -> None:
+        try:
+            await self.pages.get_page(page, self.category)
+        except Exception as e:
+            config.LOG.error(f"Failed prefetching a `/status` page: {e}")
+
+    async def show(self, interaction: discord.Interaction) -> None:
+        # The page may still need to be resolved
+        await interaction.response.defer()
+        embed = await self.render()
+        await interaction.edit_original_response(embed=embed, view=self)
+        await self.on_shown()
+
+    async def on_shown(self) -> None:
+        """
+        Forget the finished requests of the page last rendered, called once
+        it has been sent to the user. Prefetched pages are left alone until
+        they are shown
+        """
+        if self.forget is not None:
+            await self.forget(self.shown)
+
+    @discord.ui.select(
+        placeholder="Filter your requests",
+        options=[
+            discord.SelectOption(label=label, value=category or "all")
+            for category, label in FILTERS.items()
+        ],
+    )
+    async def filter_dropdown(
+        self, interaction: discord.Interaction, select: discord.ui.Select
+    ):
+        self.category = None if select.values[0] == "all" else select.values[0]
+        self.page = 0
+        await self.show(interaction)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_button(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        self.page -= 1
+        await self.show(interaction)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_button(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        self.page += 1
+        await self.show(interaction)
+
+    async def on_timeout(self) -> None:
+        # Let the prefetches finish, rather than stopping them in the
+        # middle of storing what they found
+        await asyncio.gather(*self._prefetches)
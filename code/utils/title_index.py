@@ -0,0 +1,150 @@
+import bisect
+from collections import OrderedDict
+
+
+class TitleIndex:
+    """
+    In-memory prefix/trigram index of movie and show titles used to
+    autocomplete `/request` without contacting Radarr/Sonarr
+    """
+
+    def __init__(self, max_lookup_titles: int = 1000):
+        """
+        Args:
+            max_lookup_titles (int): The number of titles from lookup
+                results kept per service, the least recently seen are
+                dropped first
+        """
+        self.max_lookup_titles = max_lookup_titles
+        self._entries = {"radarr": {}, "sonarr": {}}
+        self._trigrams = {"radarr": {}, "sonarr": {}}
+        self._library_keys = {"radarr": set(), "sonarr": set()}
+        self._lookup_keys = {"radarr": OrderedDict(), "sonarr": OrderedDict()}
+        self._sorted_keys = {"radarr": [], "sonarr": []}
+        self._dirty = {"radarr": False, "sonarr": False}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    @staticmethod
+    def trigrams(text: str) -> set:
+        padded = f" {text} "
+        return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, service: str, title: str, year: int) -> None:
+        """
+        Add a title seen in a lookup result to the index
+
+        Args:
+            service (str): The service the title belongs to
+            title (str): The title of the content
+            year (int): The release year of the content
+        """
+        key = self._insert(service, title, year)
+        lookup_keys = self._lookup_keys[service]
+        lookup_keys[key] = None
+        lookup_keys.move_to_end(key)
+        while len(lookup_keys) > self.max_lookup_titles:
+            oldest, _ = lookup_keys.popitem(last=False)
+            if oldest not in self._library_keys[service]:
+                self._remove(service, oldest)
+
+    def sync(self, service: str, library: list) -> None:
+        """
+        Bring the library titles of a service up to date, only touching the
+        titles that were added or removed since the last sync
+
+        Args:
+            service (str): The service the library belongs to
+            library (list): The movies/series of the library
+        """
+        new_keys = set()
+        for content in library:
+            new_keys.add(
+                self._insert(service, content["title"], content.get("year"))
+            )
+
+        removed = (
+            self._library_keys[service]
+            - new_keys
+            - self._lookup_keys[service].keys()
+        )
+        for key in removed:
+            self._remove(service, key)
+        self._library_keys[service] = new_keys
+
+    def search(self, service: str, query: str, limit: int = 25) -> list:
+        """
+        Find the titles best matching a partially typed query. Titles
+        starting with the query come first, followed by fuzzy trigram matches
+        so that typos still find results
+
+        Args:
+            service (str): The service to search the titles of
+            query (str): The partially typed query
+            limit (int): The maximum number of results
+
+        Returns:
+            list: (display name, value) tuples of the matches
+        """
+        query = self.normalize(query)
+        if not query:
+            return []
+
+        entries = self._entries[service]
+        if self._dirty[service]:
+            self._sorted_keys[service] = sorted(entries)
+            self._dirty[service] = False
+        sorted_keys = self._sorted_keys[service]
+
+        matches = []
+        # Prefix matches through a binary search of the sorted titles
+        i = bisect.bisect_left(sorted_keys, query)
+        while (
+            i < len(sorted_keys)
+            and sorted_keys[i].startswith(query)
+            and len(matches) < limit
+        ):
+            matches.append(sorted_keys[i])
+            i += 1
+
+        # Fill up with the titles sharing the most trigrams with the query
+        if len(matches) < limit:
+            query_trigrams = self.trigrams(query)
+            scores = {}
+            for trigram in query_trigrams:
+                for key in self._trigrams[service].get(trigram, ()):
+                    scores[key] = scores.get(key, 0) + 1
+
+            found = set(matches)
+            threshold = len(query_trigrams) / 3
+            for key in sorted(scores, key=scores.get, reverse=True):
+                if len(matches) >= limit or scores[key] < threshold:
+                    break
+                if key not in found:
+                    matches.append(key)
+
+        return [entries[key] for key in matches]
+
+    def _insert(self, service: str, title: str, year: int) -> str:
+        key = self.normalize(f"{title} {year}" if year else title)
+        if key not in self._entries[service]:
+            self._entries[service][key] = (
+                f"{title} ({year})" if year else title,
+                f"{title} {year}" if year else title,
+            )
+            for trigram in self.trigrams(key):
+                self._trigrams[service].setdefault(trigram, set()).add(key)
+            self._dirty[service] = True
+        return key
+
+    def _remove(self, service: str, key: str) -> None:
+        self._entries[service].pop(key, None)
+        for trigram in self.trigrams(key):
+            keys = self._trigrams[service].get(trigram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._trigrams[service][trigram]
+        self._dirty[service] = True
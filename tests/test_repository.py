@@ -0,0 +1,234 @@
+import asyncio
+import datetime
+
+from utils.models import Requests
+from utils.repository import (
+    acquire_lease,
+    add_account,
+    add_requests,
+    apply_content_events,
+    claim_pool_account,
+    delete_user_requests,
+    get_next_deletion_time,
+    get_requested_content,
+    get_sync_mark,
+    get_user_account,
+    get_user_requests,
+    pop_content_requests,
+    release_lease,
+    set_content_statuses,
+    set_sync_mark,
+)
+
+
+def movie(local_id: int, user_id: int = 1, **kwargs) -> Requests:
+    return Requests(
+        title=f"Movie {local_id}",
+        release_year=2000,
+        local_id=local_id,
+        tmdbid=100 + local_id,
+        tvdbid=None,
+        user_id=user_id,
+        **kwargs,
+    )
+
+
+def show(local_id: int, user_id: int = 1, **kwargs) -> Requests:
+    return Requests(
+        title=f"Show {local_id}",
+        release_year=2000,
+        local_id=local_id,
+        tmdbid=None,
+        tvdbid=200 + local_id,
+        user_id=user_id,
+        **kwargs,
+    )
+
+
+def test_add_and_get_user_requests(db):
+    db(add_requests([movie(1), show(2), movie(3, user_id=2)]))
+
+    rows = db(get_user_requests(1))
+
+    assert sorted((row.title, row.local_id) for row in rows) == [
+        ("Movie 1", 1),
+        ("Show 2", 2),
+    ]
+
+
+def test_delete_user_requests(db):
+    db(add_requests([movie(1), movie(2), movie(1, user_id=2)]))
+
+    db(delete_user_requests(1, [("radarr", 1)]))
+
+    assert [row.local_id for row in db(get_user_requests(1))] == [2]
+    # Other users keep their requests for the same content
+    assert [row.local_id for row in db(get_user_requests(2))] == [1]
+
+
+def test_delete_user_requests_only_matches_the_service(db):
+    # Radarr and Sonarr can give their content the same ID
+    db(add_requests([movie(5), show(5)]))
+
+    db(delete_user_requests(1, [("radarr", 5)]))
+
+    assert [row.title for row in db(get_user_requests(1))] == ["Show 5"]
+
+
+def test_get_requested_content(db):
+    db(
+        add_requests(
+            [
+                movie(1),
+                movie(1, user_id=2),
+                show(1),
+                movie(2, state="DOWNLOADED"),
+            ]
+        )
+    )
+    db(
+        set_content_statuses(
+            "radarr",
+            [
+                {
+                    "local_id": 1,
+                    "state": "DOWNLOADING",
+                    "progress": 0.5,
+                    "time_left": "00:10:00",
+                    "percent_of_episodes": None,
+                }
+            ],
+        )
+    )
+
+    # Finished content is left out, and each piece of content is listed once
+    assert db(get_requested_content()) == {
+        ("radarr", 1): ("DOWNLOADING", True),
+        ("sonarr", 1): (None, False),
+    }
+
+
+def test_sync_marks(db):
+    assert db(get_sync_mark("history:radarr")) is None
+
+    first = datetime.datetime(2024, 1, 1, 12, 0)
+    db(set_sync_mark("history:radarr", first, 10))
+    assert db(get_sync_mark("history:radarr")) == (first, 10)
+
+    second = datetime.datetime(2024, 1, 2, 12, 0)
+    db(set_sync_mark("history:radarr", second, 20))
+    assert db(get_sync_mark("history:radarr")) == (second, 20)
+    assert db(get_sync_mark("history:sonarr")) is None
+
+
+def test_leases(db):
+    assert db(acquire_lease("leader", "a", 60))
+    assert not db(acquire_lease("leader", "b", 60))
+    # The holder can renew its lease
+    assert db(acquire_lease("leader", "a", 60))
+
+    # Releasing someone else's lease does nothing
+    db(release_lease("leader", "b"))
+    assert not db(acquire_lease("leader", "b", 60))
+
+    db(release_lease("leader", "a"))
+    assert db(acquire_lease("leader", "b", 60))
+
+
+def test_expired_lease_is_taken_over(db):
+    assert db(acquire_lease("leader", "a", -1))
+    assert db(acquire_lease("leader", "b", 60))
+    assert not db(acquire_lease("leader", "a", 60))
+
+
+def test_apply_content_events(db):
+    checked = datetime.datetime(2024, 1, 1, 12, 0)
+    db(
+        add_requests(
+            [
+                movie(1, progress=0.5, last_checked=checked),
+                movie(1, user_id=2, last_checked=checked),
+                movie(2, last_checked=checked),
+                show(1, last_checked=checked),
+            ]
+        )
+    )
+
+    db(apply_content_events("radarr", {1: "DOWNLOADED", 2: None}))
+
+    rows = db(get_user_requests(1))
+    states = {
+        (row.title, row.state, row.progress, row.last_checked == checked)
+        for row in rows
+    }
+    assert states == {
+        ("Movie 1", "DOWNLOADED", None, False),
+        # Content that needs to be checked again is marked out of date
+        ("Movie 2", None, None, False),
+        ("Show 1", None, None, True),
+    }
+    assert [row.last_checked for row in rows if row.local_id == 2] == [None]
+    assert [row.state for row in db(get_user_requests(2))] == ["DOWNLOADED"]
+
+
+def test_pop_content_requests(db):
+    db(add_requests([movie(1), movie(1, user_id=2), movie(2), show(1)]))
+
+    removed = db(pop_content_requests("radarr", 1))
+
+    assert sorted(removed) == [("Movie 1", 1), ("Movie 1", 2)]
+    assert db(pop_content_requests("radarr", 1)) == []
+    assert sorted(row.title for row in db(get_user_requests(1))) == [
+        "Movie 2",
+        "Show 1",
+    ]
+
+
+def test_claim_pool_account(db):
+    deletion_time = datetime.datetime(2024, 1, 2, 12, 0)
+    db(add_account(None, "pool-1", None, username="pool1"))
+    db(add_account(None, "pool-2", None, username="pool2"))
+    db(add_account(3, "owned", deletion_time))
+
+    first = db(claim_pool_account(1, deletion_time))
+    second = db(claim_pool_account(2, deletion_time))
+
+    assert sorted([tuple(first), tuple(second)]) == [
+        ("pool-1", "pool1"),
+        ("pool-2", "pool2"),
+    ]
+    # The pool is empty, and accounts that are already owned are left alone
+    assert db(claim_pool_account(4, deletion_time)) is None
+    assert db(get_user_account(3)).jellyfin_user_id == "owned"
+    account = db(get_user_account(1))
+    assert account.jellyfin_user_id == first[0]
+    assert account.deletion_time == deletion_time
+
+
+def test_concurrent_claims_take_different_accounts(db):
+    deletion_time = datetime.datetime(2024, 1, 2, 12, 0)
+    db(add_account(None, "pool-1", None, username="pool1"))
+
+    async def claim_both():
+        return await asyncio.gather(
+            claim_pool_account(1, deletion_time),
+            claim_pool_account(2, deletion_time),
+        )
+
+    claims = db(claim_both())
+
+    assert sorted(claims, key=lambda claim: claim is None) == [
+        ("pool-1", "pool1"),
+        None,
+    ]
+
+
+def test_get_next_deletion_time(db):
+    assert db(get_next_deletion_time()) is None
+
+    later = datetime.datetime(2024, 1, 3, 12, 0)
+    sooner = datetime.datetime(2024, 1, 2, 12, 0)
+    db(add_account(1, "first", later))
+    db(add_account(2, "second", sooner))
+
+    assert db(get_next_deletion_time()) == sooner